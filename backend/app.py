@@ -1,14 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from langchain_core.messages import HumanMessage
+import asyncio
 import json
 import os
 from dotenv import load_dotenv
 from google.cloud import translate
 from langchain_google_genai import ChatGoogleGenerativeAI
-from re_planner import get_structured_trip_details, run_step2, process_spots,optimize_day_plan, format_itinerary_with_llm, run_itinerary_pipeline
+from re_planner import aget_structured_trip_details, run_step2, process_spots,optimize_day_plan, aformat_itinerary_with_llm, run_itinerary_pipeline
+import re_planner
 from bus__ import get_bus_routes_json
 from accomdation import find_best_nearby_hotels
+from event_loop import iterate_sync, run_sync
+from http_client import get_http_stats
+from places_cache import get_places_cache_stats
+from weather_cache import get_weather_cache_stats
+from jobs import job_manager, QueueFull
+from rate_limit import get_rate_limit_stats
+from hedging import get_hedging_stats
+from singleflight import get_singleflight_stats
+from intent_cache import get_intent_cache_stats
+from json_repair import get_json_repair_stats
+from intent_router import get_intent_router_stats
+from vertex_client import start_warm_up
+from retry import request_with_retry
 import requests
 from datetime import datetime, date, timedelta
 import uuid
@@ -55,19 +70,24 @@ def translate_auto_to_english(text: str):
     return translation.detected_language_code, translation.translated_text
 
 
-def translate_to_language(text: str, target_language: str):
-    """Translate English text back to user's target language."""
-    if not client or target_language == "en":
-        return text
+def translate_batch(texts: list, target_language: str) -> list:
+    """Translate English strings to the user's language in one request; same order as `texts`."""
+    if not client or target_language == "en" or not texts:
+        return list(texts)
     response = client.translate_text(
         request={
             "parent": parent,
-            "contents": [text],
+            "contents": list(texts),
             "mime_type": "text/plain",
             "target_language_code": target_language,
         }
     )
-    return response.translations[0].translated_text
+    return [translation.translated_text for translation in response.translations]
+
+
+def translate_to_language(text: str, target_language: str):
+    """Translate English text back to user's target language."""
+    return translate_batch([text], target_language)[0]
 
 
 # --- Initialize LLM for follow-up generation ---
@@ -75,8 +95,8 @@ llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.7)
 
 
 # --- Generate Follow-Up Questions ---
-def generate_contextual_follow_ups(user_query: str, langgraph_response: dict, detected_lang: str) -> list:
-    """Generate intelligent follow-up questions using LLM."""
+def generate_contextual_follow_ups(user_query: str, langgraph_response: dict) -> list:
+    """Generate intelligent follow-up questions using LLM (in English; see build_chat_response)."""
     try:
         response_type = "general"
         context_info = ""
@@ -130,133 +150,268 @@ def generate_contextual_follow_ups(user_query: str, langgraph_response: dict, de
                 "Any nearby attractions?"
             ]
 
-        if detected_lang != "en":
-            translated = []
-            for q in follow_ups[:5]:
-                try:
-                    translated.append(translate_to_language(q, detected_lang))
-                except:
-                    translated.append(q)
-            return translated
-
         return follow_ups[:5]
 
     except Exception as e:
         print(f"⚠️ Follow-up generation error: {e}")
-        fallback = [
+        return [
             "Tell me more about this place",
             "What are the top attractions?",
             "Show food recommendations",
             "When is the best time to visit?",
             "Transportation options available?"
         ]
-        if detected_lang != "en":
-            try:
-                return [translate_to_language(q, detected_lang) for q in fallback]
-            except:
-                return fallback
-        return fallback
 
 
 
+# --- Chat Pipeline Helpers (shared by /api/chat and /api/chat/stream) ---
+def graph_input(query_en: str) -> dict:
+    return {
+        "messages": [HumanMessage(content=query_en)],
+        "user_query": query_en
+    }
+
+
+def build_chat_response(user_query: str, final_state: dict, detected_lang: str) -> dict:
+    """Turn the final LangGraph state into the /api/chat response body."""
+    # Step 3: Extract actual LLM-generated assistant message
+    assistant_message = ""
+    for msg in reversed(final_state.get("messages", [])):
+        if hasattr(msg, "content") and not msg.content.strip().startswith("{"):
+            assistant_message = msg.content
+            break
+
+    if not assistant_message:
+        assistant_message = "I’ve processed your travel request successfully!"
+
+    # Step 4: Generate follow-ups dynamically
+    follow_ups = generate_contextual_follow_ups(user_query, final_state)
+
+    # Step 5: Detect response type
+    response_type = "chat"
+    if final_state.get("itinerary_plans"):
+        response_type = "plans"
+    elif final_state.get("flight_data"):
+        response_type = "flights"
+    elif final_state.get("travel_bookings"):
+        response_type = "bookings"
+    elif final_state.get("acomdation"):
+        response_type = "acomdation"
+
+    # Step 6: Translate LLM message + follow-ups back to user’s language (one request)
+    try:
+        translated_message, *follow_ups = translate_batch([assistant_message, *follow_ups], detected_lang)
+    except Exception as e:
+        print(f"⚠️ Translation error, replying in English: {e}")
+        translated_message = assistant_message
+
+    # Step 7: Build final response JSON
+    response_data = {
+        "response_type": response_type,
+        "message": translated_message,
+        "follow_up_questions": follow_ups
+    }
+
+    # Optional: include structured data (plans, flights, etc.)
+    if final_state.get("itinerary_plans"):
+        response_data["plans"] = final_state["itinerary_plans"]
+    elif final_state.get("flight_data"):
+        response_data["flight_options"] = final_state["flight_data"]
+    elif final_state.get("acomdation"):
+        response_data["acomdation"] = final_state["acomdation"]
+    elif final_state.get("travel_bookings"):
+        response_data["travel_bookings"] = final_state["travel_bookings"]
+
+    return response_data
+
+
+HEALTH_RESPONSE = {"status": "healthy", "service": "Travel Planner API"}
+
+CHAT_ERROR_RESPONSE = {
+    "response_type": "error",
+    "message": "Unexpected server error occurred. Please try again.",
+    "follow_up_questions": [
+        "Plan a trip",
+        "Find flight options",
+        "Get hotel recommendations",
+        "Explore destinations",
+        "Suggest weekend getaways"
+    ]
+}
+
+
+def run_chat_job(user_query: str, report) -> dict:
+    """Background-job version of /api/chat; `report` receives each pipeline stage."""
+    detected_lang, query_en = translate_auto_to_english(user_query)
+    print(f"🌐 Detected: {detected_lang} | English Query: {query_en}")
+    report("query")
+
+    final_state = {}
+    for mode, chunk in iterate_sync(langgraph_app.astream(graph_input(query_en), stream_mode=["custom", "values"])):
+        if mode == "custom":
+            report(chunk["event"])
+        else:
+            final_state = chunk
+
+    report("finalizing")
+    return build_chat_response(user_query, final_state, detected_lang)
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def chat_stream_events(user_query: str):
+    """SSE body of /api/chat/stream, one event string at a time."""
+    try:
+        detected_lang, query_en = await asyncio.to_thread(translate_auto_to_english, user_query)
+        print(f"🌐 Detected: {detected_lang} | English Query: {query_en}")
+        yield sse_event("query", {"detected_language": detected_lang, "query_en": query_en})
+
+        final_state = {}
+        async for mode, chunk in langgraph_app.astream(graph_input(query_en), stream_mode=["custom", "values"]):
+            if mode == "custom":
+                yield sse_event(chunk["event"], chunk["data"])
+            else:
+                final_state = chunk
+        print("✅ LangGraph stream complete.")
+
+        yield sse_event("final", await asyncio.to_thread(build_chat_response, user_query, final_state, detected_lang))
+
+    except Exception as e:
+        print(f"🔥 Stream Error: {e}")
+        yield sse_event("error", CHAT_ERROR_RESPONSE)
+
+
 # --- Flask Application ---
 app = Flask(__name__)
 CORS(app)
 
+# Token + TLS handshake for both Vertex clients (planner.py and re_planner.py) before the first request.
+VERTEX_WARMUP_TARGETS = ((None, None), (re_planner.VERTEX_PROJECT, re_planner.VERTEX_LOCATION))
+start_warm_up(*VERTEX_WARMUP_TARGETS)
+
 
 @app.route("/api/chat", methods=["POST"])
 def chat_endpoint():
     try:
         data = request.get_json()
+    except Exception as e:
+        print(f"🔥 Global Error: {e}")
+        return jsonify(CHAT_ERROR_RESPONSE), 500
+    body, status = run_sync(chat_handler(data))
+    return jsonify(body), status
+
+
+async def chat_handler(data) -> tuple:
+    """POST /api/chat body -> (response body, status); shared with asgi_app.py."""
+    try:
         user_query = data.get("query", "")
 
         if not user_query:
-            return jsonify({"response_type": "chat", "message": "Please provide a query."}), 400
+            return {"response_type": "chat", "message": "Please provide a query."}, 400
 
         print(f"\n🆕 New Request: {user_query}")
 
         # Step 1: Translate user query → English
-        detected_lang, query_en = translate_auto_to_english(user_query)
+        detected_lang, query_en = await asyncio.to_thread(translate_auto_to_english, user_query)
         print(f"🌐 Detected: {detected_lang} | English Query: {query_en}")
 
         # Step 2: Run LangGraph pipeline
-        final_state = langgraph_app.invoke({
-            "messages": [HumanMessage(content=query_en)],
-            "user_query": query_en
-        })
+        final_state = await langgraph_app.ainvoke(graph_input(query_en))
         print("✅ LangGraph execution complete.")
 
-        # Step 3: Extract actual LLM-generated assistant message
-        assistant_message = ""
-        for msg in reversed(final_state.get("messages", [])):
-            if hasattr(msg, "content") and not msg.content.strip().startswith("{"):
-                assistant_message = msg.content
-                break
+        response_data = await asyncio.to_thread(build_chat_response, user_query, final_state, detected_lang)
+        print(f"✅ Final Response Sent: {response_data}")
+        return response_data, 200
 
-        if not assistant_message:
-            assistant_message = "I’ve processed your travel request successfully!"
+    except (Exception, asyncio.CancelledError) as e:  # a cancelled shared run is still an error response
+        print(f"🔥 Global Error: {e!r}")
+        return CHAT_ERROR_RESPONSE, 500
 
-        # Step 4: Generate follow-ups dynamically
-        follow_ups = generate_contextual_follow_ups(user_query, final_state, detected_lang)
 
-        # Step 5: Detect response type
-        response_type = "chat"
-        if final_state.get("itinerary_plans"):
-            response_type = "plans"
-        elif final_state.get("flight_data"):
-            response_type = "flights"
-        elif final_state.get("travel_bookings"):
-            response_type = "bookings"
-        elif final_state.get("acomdation"):
-            response_type = "acomdation"
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream_endpoint():
+    """
+    Same pipeline as /api/chat, as Server-Sent Events.
 
-        # Step 6: Translate LLM message back to user’s language
-        translated_message = translate_to_language(assistant_message, detected_lang)
+    Itinerary requests emit `trip_details`, `spots`, `day_plan`, one `plan` per
+    formatted plan and one `enriched` per plan as each stage completes. Every
+    request ends with `final` (the /api/chat body) or `error`.
+    """
+    data = request.get_json(silent=True) or {}
+    user_query = data.get("query", "")
 
-        # Step 7: Build final response JSON
-        response_data = {
-            "response_type": response_type,
-            "message": translated_message,
-            "follow_up_questions": follow_ups
-        }
+    if not user_query:
+        return jsonify({"response_type": "chat", "message": "Please provide a query."}), 400
 
-        # Optional: include structured data (plans, flights, etc.)
-        if final_state.get("itinerary_plans"):
-            response_data["plans"] = final_state["itinerary_plans"]
-        elif final_state.get("flight_data"):
-            response_data["flight_options"] = final_state["flight_data"]
-        elif final_state.get("acomdation"):
-            response_data["acomdation"] = final_state["acomdation"]
-        elif final_state.get("travel_bookings"):
-            response_data["travel_bookings"] = final_state["travel_bookings"]
+    print(f"\n🆕 New Stream Request: {user_query}")
+    return Response(
+        stream_with_context(iterate_sync(chat_stream_events(user_query))),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        print(f"✅ Final Response Sent: {response_data}")
-        return jsonify(response_data)
 
-    except Exception as e:
-        print(f"🔥 Global Error: {e}")
-        return jsonify({
-            "response_type": "error",
-            "message": "Unexpected server error occurred. Please try again.",
-            "follow_up_questions": [
-                "Plan a trip",
-                "Find flight options",
-                "Get hotel recommendations",
-                "Explore destinations",
-                "Suggest weekend getaways"
-            ]
-        }), 500
+@app.route("/api/jobs", methods=["POST"])
+def submit_job():
+    """Queue a /api/chat request; poll /api/jobs/<id> and fetch /api/jobs/<id>/result."""
+    data = request.get_json(silent=True) or {}
+    user_query = data.get("query", "")
+
+    if not user_query:
+        return jsonify({"response_type": "chat", "message": "Please provide a query."}), 400
+
+    try:
+        job_id = job_manager.submit(run_chat_job, user_query, kind="chat")
+    except QueueFull:
+        return jsonify({"error": "Too many queued requests. Please retry shortly."}), 429, {"Retry-After": "5"}
+
+    print(f"\n🆕 Queued Job {job_id}: {user_query}")
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/jobs/{job_id}",
+        "result_url": f"/api/jobs/{job_id}/result",
+    }), 202
+
+
+def job_status_body(job: dict) -> dict:
+    return {k: v for k, v in job.items() if k != "result"}
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job_status_body(job))
+
+
+@app.route("/api/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    if job["status"] == "done":
+        return jsonify(job["result"])
+    if job["status"] == "failed":
+        return jsonify(CHAT_ERROR_RESPONSE), 500
+    return jsonify(job_status_body(job)), 202
 
 
 @app.route('/api/enhance', methods=['POST', 'OPTIONS'])
 def enhance():
     if request.method == 'OPTIONS':
         return jsonify({'message': 'CORS preflight passed'}), 200
+    body, status = run_sync(enhance_handler(request.get_json(silent=True) or {}))
+    return jsonify(body), status
 
-    data = request.get_json(silent=True) or {}
+
+async def enhance_handler(data: dict) -> tuple:
+    """POST /api/enhance body -> (response body, status); shared with asgi_app.py."""
     print("\n📩 Incoming Enhance Request Data:")
     print(json.dumps(data, indent=2))
-    import asyncio
 
     try:
         # --- Extract fields from request ---
@@ -266,30 +421,30 @@ def enhance():
         card_index = data.get("card_index")
 
         if not all([plan_details, user_query, user_enhance_query]):
-            return jsonify({"error": "Missing one or more required fields (plan_details, query_en, user_enhance)"}), 400
+            return {"error": "Missing one or more required fields (plan_details, query_en, user_enhance)"}, 400
 
         # --- Merge enhance query + user query ---
         new_enhance_query = f"{user_enhance_query} {user_query}"
         print(f"\n🧠 Combined Enhance Query:\n{new_enhance_query}\n")
 
         # --- Step 1: Get structured trip intent ---
-        trip1 = get_structured_trip_details(new_enhance_query)
+        trip1 = await aget_structured_trip_details(new_enhance_query)
         print("\n✅ Step 1: Structured Trip Intent Extracted\n")
         print(trip1.model_dump_json(indent=2))
 
         # --- Step 2: Destination + Spots + Hotels ---
-        step2 = asyncio.run(run_step2(trip1.model_dump()))
+        step2 = await run_step2(trip1.model_dump())
         print("\n✅ Step 2 Output (Spots & Hotels):\n")
         print(json.dumps(step2, indent=2))
 
         # --- Step 3: Distance + Cost Estimation ---
-        step3 = asyncio.run(process_spots(step2))
+        step3 = await process_spots(step2)
         print("\n✅ Step 3 Output (Processed Spots):\n")
         print(json.dumps(step3, indent=2))
 
         # --- Step 4: Optimize Itinerary with LLM ---
-        python_output = optimize_day_plan(step2, step3)
-        final_itinerary = format_itinerary_with_llm(
+        python_output = await asyncio.to_thread(optimize_day_plan, step2, step3)
+        final_itinerary = await aformat_itinerary_with_llm(
             python_output, new_enhance_query, plan_details
         )
 
@@ -304,7 +459,7 @@ def enhance():
         print("\n✅ Step 3-4 Complete\n")
 
         print("✅ step 4-5-6 weather added ✅")
-        value = asyncio.run(run_itinerary_pipeline(final_itinerary))
+        value = await run_itinerary_pipeline(final_itinerary)
 
         # Also safely attach card index to the returned value
         if isinstance(value, dict):
@@ -315,11 +470,11 @@ def enhance():
                     item["card_index"] = card_index
 
         print(json.dumps(value, indent=2))
-        return jsonify(value), 200
+        return value, 200
 
-    except Exception as e:
-        print("\n❌ ERROR in Enhance Pipeline:", str(e))
-        return jsonify({"error": str(e)}), 500  
+    except (Exception, asyncio.CancelledError) as e:
+        print("\n❌ ERROR in Enhance Pipeline:", repr(e))
+        return {"error": str(e) or type(e).__name__}, 500
 
 
 
@@ -328,9 +483,13 @@ def enhance():
 def get_bus_routes():
     if request.method == 'OPTIONS':
         return jsonify({'message': 'CORS preflight passed'}), 200
-    
+    body, status = bus_routes_handler(request.get_json(silent=True) or {})
+    return jsonify(body), status
+
+
+def bus_routes_handler(data: dict):
+    """POST /api/bus-routes body -> (response body, status); shared with asgi_app.py."""
     try:
-        data = request.get_json(silent=True) or {}
         print("\n📩 Incoming Bus Routes Request:")
         print(json.dumps(data, indent=2))
         
@@ -340,10 +499,10 @@ def get_bus_routes():
         departure_date = data.get('departure_date')  # Optional
         
         if not origin or not destination:
-            return jsonify({
+            return {
                 "error": "Both origin and destination are required",
                 "success": False
-            }), 400
+            }, 400
         
         print(f"🚌 Searching bus routes from {origin} to {destination}")
         
@@ -363,22 +522,22 @@ def get_bus_routes():
         
         # Check if result is an error
         if isinstance(routes_result, dict) and "error" in routes_result:
-            return jsonify({
+            return {
                 "success": False,
                 "error": routes_result["error"],
                 "routes": []
-            }), 200
+            }, 200
         
         # Parse the JSON string result
         if isinstance(routes_result, str):
             try:
                 routes_data = json.loads(routes_result)
             except json.JSONDecodeError:
-                return jsonify({
+                return {
                     "success": False,
                     "error": "Failed to parse bus routes data",
                     "routes": []
-                }), 500
+                }, 500
         else:
             routes_data = routes_result
         
@@ -435,15 +594,15 @@ def get_bus_routes():
         }
         
         print(f"✅ Found {len(transformed_routes)} bus routes")
-        return jsonify(response_data), 200
+        return response_data, 200
         
     except Exception as e:
         print(f"❌ Error in bus routes endpoint: {str(e)}")
-        return jsonify({
+        return {
             "success": False,
             "error": f"Internal server error: {str(e)}",
             "routes": []
-        }), 500
+        }, 500
 
 
 # --- AMADEUS API HELPER FUNCTIONS ---
@@ -453,7 +612,7 @@ def get_amadeus_token(client_id, client_secret):
         token_headers = {'Content-Type': 'application/x-www-form-urlencoded'}
         token_data = {'grant_type': 'client_credentials', 'client_id': client_id, 'client_secret': client_secret}
         token_url = 'https://test.api.amadeus.com/v1/security/oauth2/token'
-        token_response = requests.post(token_url, headers=token_headers, data=token_data)
+        token_response = request_with_retry("POST", token_url, upstream="amadeus", headers=token_headers, data=token_data)
         token_response.raise_for_status()
         return token_response.json().get('access_token')
     except requests.exceptions.RequestException as e:
@@ -472,7 +631,7 @@ def get_iata_code_for_city(access_token, city_name):
     }
     location_search_url = 'https://test.api.amadeus.com/v1/reference-data/locations'
     try:
-        iata_response = requests.get(location_search_url, headers=iata_headers, params=iata_params)
+        iata_response = request_with_retry("GET", location_search_url, upstream="amadeus", headers=iata_headers, params=iata_params)
         iata_response.raise_for_status()
         data = iata_response.json().get('data')
         return data[0].get('iataCode') if data and len(data) > 0 else None
@@ -484,9 +643,13 @@ def get_iata_code_for_city(access_token, city_name):
 def search_flights():
     if request.method == 'OPTIONS':
         return jsonify({'message': 'CORS preflight passed'}), 200
-    
+    body, status = flights_handler(request.get_json(silent=True) or {})
+    return jsonify(body), status
+
+
+def flights_handler(data: dict):
+    """POST /api/flights body -> (response body, status); shared with asgi_app.py."""
     try:
-        data = request.get_json(silent=True) or {}
         print("\n✈️ Incoming Flight Search Request:")
         print(json.dumps(data, indent=2))
         
@@ -498,11 +661,11 @@ def search_flights():
         travel_class = data.get('class', 'economy')
         
         if not all([origin, destination, departure_date]):
-            return jsonify({
+            return {
                 "success": False,
                 "error": "Origin, destination, and departure date are required",
                 "flights": []
-            }), 400
+            }, 400
         
         print(f"✈️ Searching flights from {origin} to {destination} on {departure_date}")
         
@@ -535,7 +698,7 @@ def search_flights():
             
             flight_headers = {'Authorization': f'Bearer {token}'}
             flight_search_url = 'https://test.api.amadeus.com/v2/shopping/flight-offers'
-            flight_response = requests.get(flight_search_url, headers=flight_headers, params=flight_params)
+            flight_response = request_with_retry("GET", flight_search_url, upstream="amadeus", headers=flight_headers, params=flight_params)
             flight_response.raise_for_status()
             flight_data = flight_response.json().get('data', [])
             
@@ -565,7 +728,7 @@ def search_flights():
                         "to": destination
                     }
                 ]
-                return jsonify({
+                return {
                     "success": True,
                     "flights": mock_flights,
                     "total_flights": len(mock_flights),
@@ -576,7 +739,7 @@ def search_flights():
                         "passengers": passengers,
                         "class": travel_class
                     }
-                }), 200
+                }, 200
             
             # 4. Process and Structure Results
             structured_flights = []
@@ -631,7 +794,7 @@ def search_flights():
             }
             
             print(f"✅ Found {len(structured_flights)} flights")
-            return jsonify(response_data), 200
+            return response_data, 200
             
         except Exception as api_error:
             print(f"❌ Amadeus API Error: {str(api_error)}")
@@ -676,23 +839,27 @@ def search_flights():
             }
 
             print(ans)
-            return jsonify(ans), 200
+            return ans, 200
         
     except Exception as e:
         print(f"❌ Error in flight search endpoint: {str(e)}")
-        return jsonify({
+        return {
             "success": False,
             "error": f"Internal server error: {str(e)}",
             "flights": []
-        }), 500
+        }, 500
 
 @app.route('/api/hotels', methods=['POST', 'OPTIONS'])
 def search_hotels():
     if request.method == 'OPTIONS':
         return jsonify({'message': 'CORS preflight passed'}), 200
-    
+    body, status = hotels_handler(request.get_json(silent=True) or {})
+    return jsonify(body), status
+
+
+def hotels_handler(data: dict):
+    """POST /api/hotels body -> (response body, status); shared with asgi_app.py."""
     try:
-        data = request.get_json(silent=True) or {}
         print("\n🏨 Incoming Hotel Search Request:")
         print(json.dumps(data, indent=2))
         
@@ -704,11 +871,11 @@ def search_hotels():
         rooms = data.get('rooms', '1')
         
         if not city:
-            return jsonify({
+            return {
                 "success": False,
                 "error": "City is required for hotel search",
                 "hotels": []
-            }), 400
+            }, 400
         
         print(f"🏨 Searching hotels in {city}")
         
@@ -747,7 +914,7 @@ def search_hotels():
                     }
                 ]
                 
-                return jsonify({
+                return {
                     "success": True,
                     "hotels": mock_hotels,
                     "total_hotels": len(mock_hotels),
@@ -759,7 +926,7 @@ def search_hotels():
                         "rooms": rooms
                     },
                     "note": "Using fallback data"
-                }), 200
+                }, 200
             
             # Transform Google Places data to match frontend expectations
             structured_hotels = []
@@ -799,7 +966,7 @@ def search_hotels():
             }
             
             print(f"✅ Found {len(structured_hotels)} hotels")
-            return jsonify(response_data), 200
+            return response_data, 200
             
         except Exception as api_error:
             print(f"❌ Hotel API Error: {str(api_error)}")
@@ -819,7 +986,7 @@ def search_hotels():
                     "reviews": 1250
                 }
             ]
-            return jsonify({
+            return {
                 "success": True,
                 "hotels": mock_hotels,
                 "total_hotels": len(mock_hotels),
@@ -831,19 +998,39 @@ def search_hotels():
                     "rooms": rooms
                 },
                 "note": "Using fallback data due to API limitations"
-            }), 200
+            }, 200
         
     except Exception as e:
         print(f"❌ Error in hotel search endpoint: {str(e)}")
-        return jsonify({
+        return {
             "success": False,
             "error": f"Internal server error: {str(e)}",
             "hotels": []
-        }), 500
+        }, 500
 
 @app.route("/api/health", methods=["GET"])
 def health_check():
-    return jsonify({"status": "healthy", "service": "Travel Planner API"})
+    return jsonify(HEALTH_RESPONSE)
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    return jsonify(metrics_body())
+
+
+def metrics_body() -> dict:
+    return {
+        "http": get_http_stats(),
+        "places_cache": get_places_cache_stats(),
+        "weather_cache": get_weather_cache_stats(),
+        "intent_cache": get_intent_cache_stats(),
+        "json_repair": get_json_repair_stats(),
+        "intent_router": get_intent_router_stats(),
+        "rate_limits": get_rate_limit_stats(),
+        "hedging": get_hedging_stats(),
+        "singleflight": get_singleflight_stats(),
+        "jobs": job_manager.stats(),
+    }
 
 
 if __name__ == "__main__":
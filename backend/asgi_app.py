@@ -0,0 +1,134 @@
+"""
+ASGI version of the app.py API, for serving with uvicorn:
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5001
+
+Same paths and request/response bodies as the Flask app; both call the
+handlers in app.py. The pipeline handlers (chat, enhance) are awaited on the
+server's event loop, so a request waiting on Gemini or Google Maps holds no
+thread. The bus, flight and hotel searches are blocking `requests` code and
+run on the default thread pool. See bench_asgi.py for a load comparison.
+"""
+import asyncio
+import contextlib
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import app as flask_app
+from vertex_client import VERTEX_WARMUP, awarm_up
+
+# -------------------------
+# CONFIG
+# -------------------------
+ASGI_HOST = os.getenv("ASGI_HOST", "0.0.0.0")
+ASGI_PORT = int(os.getenv("ASGI_PORT", "5001"))
+
+CORS_PREFLIGHT_RESPONSE = {'message': 'CORS preflight passed'}
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    # app.py warms the Vertex clients on the background loop the Flask views use;
+    # the handlers here await the pipeline on uvicorn's loop, which gets its own.
+    warm_up = None
+    if VERTEX_WARMUP:
+        warm_up = asyncio.ensure_future(asyncio.gather(*(awarm_up(*target) for target in flask_app.VERTEX_WARMUP_TARGETS)))
+    yield
+    if warm_up is not None:
+        warm_up.cancel()
+
+
+app = FastAPI(title="Travel Planner API", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+async def json_body(request: Request, default=None):
+    """Parsed JSON body, or `default` when it is missing or malformed (Flask's get_json(silent=True))."""
+    try:
+        return await request.json()
+    except Exception:
+        return default
+
+
+def respond(body, status: int = 200) -> JSONResponse:
+    return JSONResponse(jsonable_encoder(body), status_code=status)
+
+
+@app.post("/api/chat")
+async def chat_endpoint(request: Request):
+    data = await json_body(request)
+    if data is None:
+        print("🔥 Global Error: request body is not valid JSON")
+        return respond(flask_app.CHAT_ERROR_RESPONSE, 500)
+    return respond(*await flask_app.chat_handler(data))
+
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: Request):
+    data = await json_body(request) or {}
+    user_query = data.get("query", "")
+
+    if not user_query:
+        return respond({"response_type": "chat", "message": "Please provide a query."}, 400)
+
+    print(f"\n🆕 New Stream Request: {user_query}")
+    return StreamingResponse(
+        flask_app.chat_stream_events(user_query),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/enhance")
+async def enhance(request: Request):
+    return respond(*await flask_app.enhance_handler(await json_body(request) or {}))
+
+
+@app.post("/api/bus-routes")
+async def get_bus_routes(request: Request):
+    return respond(*await asyncio.to_thread(flask_app.bus_routes_handler, await json_body(request) or {}))
+
+
+@app.post("/api/flights")
+async def search_flights(request: Request):
+    return respond(*await asyncio.to_thread(flask_app.flights_handler, await json_body(request) or {}))
+
+
+@app.post("/api/hotels")
+async def search_hotels(request: Request):
+    return respond(*await asyncio.to_thread(flask_app.hotels_handler, await json_body(request) or {}))
+
+
+# The Flask views answer a bare OPTIONS too, not only real CORS preflights
+# (those are answered by the middleware before reaching these).
+@app.options("/api/enhance")
+@app.options("/api/bus-routes")
+@app.options("/api/flights")
+@app.options("/api/hotels")
+async def options_endpoint():
+    return respond(CORS_PREFLIGHT_RESPONSE)
+
+
+@app.get("/api/health")
+async def health_check():
+    return respond(flask_app.HEALTH_RESPONSE)
+
+
+@app.get("/api/metrics")
+async def metrics():
+    return respond(flask_app.metrics_body())
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    print("\n🚀 Starting Travel Planner Backend (ASGI)")
+    print(f"➡ Listening at: http://{ASGI_HOST}:{ASGI_PORT}/api/chat")
+    uvicorn.run(app, host=ASGI_HOST, port=ASGI_PORT)
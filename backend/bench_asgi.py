@@ -0,0 +1,212 @@
+"""
+Load benchmark: Flask (app.py) vs ASGI (asgi_app.py) serving /api/chat.
+
+Both servers run in this process against the same stand-in pipeline: the
+LangGraph app is replaced by one that just waits `--latency-ms` (the real one
+spends nearly all its time waiting on Gemini, Places and Distance Matrix), and
+translation is a no-op. For each concurrency level, that many clients send
+`--rounds` requests back to back; the table shows throughput, latency and the
+peak number of requests the pipeline saw in flight at once, i.e. how many
+concurrent requests one process actually served.
+
+Flask runs on a pool of `--flask-threads` request threads, like gunicorn's
+gthread worker (app.yaml's default sync worker serves one request at a time).
+uvicorn runs asgi_app.app on one event loop.
+
+Usage:
+    python bench_asgi.py [--levels 1,16,64,256] [--rounds 2] [--latency-ms 200] [--flask-threads 8]
+"""
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("VERTEX_WARMUP", "0")
+
+import aiohttp  # noqa: E402
+import uvicorn  # noqa: E402
+from werkzeug.serving import BaseWSGIServer  # noqa: E402
+
+import app as flask_app  # noqa: E402
+import asgi_app  # noqa: E402
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# -------------------------
+# STAND-IN PIPELINE
+# -------------------------
+class StubGraph:
+    """Answers `ainvoke` after `latency_sec`, counting requests in flight."""
+
+    def __init__(self, latency_sec: float):
+        self.latency_sec = latency_sec
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()  # Flask requests arrive on the event_loop thread, ASGI ones on uvicorn's
+
+    async def ainvoke(self, state):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency_sec)
+            return {"messages": state["messages"]}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def reset(self):
+        with self._lock:
+            self.peak = 0
+
+
+def install_stubs(latency_sec: float) -> StubGraph:
+    graph = StubGraph(latency_sec)
+    flask_app.langgraph_app = graph
+    flask_app.translate_auto_to_english = lambda text: ("en", text)
+    flask_app.build_chat_response = lambda user_query, final_state, detected_lang: {
+        "response_type": "chat",
+        "message": f"Echo: {user_query}",
+        "follow_up_questions": [],
+    }
+    return graph
+
+
+# -------------------------
+# SERVERS
+# -------------------------
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server with a fixed pool of request threads (gunicorn --threads N)."""
+
+    def __init__(self, host, port, wsgi_app, threads):
+        super().__init__(host, port, wsgi_app)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="flask-request")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+@contextlib.contextmanager
+def flask_server(threads: int):
+    port = _free_port()
+    server = PooledWSGIServer("127.0.0.1", port, flask_app.app, threads)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.shutdown()
+        server.pool.shutdown(wait=False, cancel_futures=True)
+
+
+@contextlib.contextmanager
+def asgi_server():
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(asgi_app.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+# -------------------------
+# LOAD
+# -------------------------
+async def run_level(base_url: str, concurrency: int, rounds: int):
+    latencies, errors = [], 0
+
+    async def client(session, n):
+        nonlocal errors
+        for r in range(rounds):
+            t0 = time.perf_counter()
+            try:
+                async with session.post(f"{base_url}/api/chat", json={"query": f"client {n} round {r}"}) as resp:
+                    await resp.read()
+                    if resp.status != 200:
+                        errors += 1
+                        continue
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - t0)
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=600)) as session:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client(session, n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    return elapsed, latencies, errors
+
+
+def _pct(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main(levels, rounds: int, latency_ms: float, flask_threads: int):
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    graph = install_stubs(latency_ms / 1000)
+
+    servers = (
+        (f"Flask ({flask_threads} threads)", lambda: flask_server(flask_threads)),
+        ("ASGI (uvicorn)", asgi_server),
+    )
+    rows = []
+    # The handlers log every request; keep the table readable.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for label, make_server in servers:
+            with make_server() as base_url:
+                for concurrency in levels:
+                    graph.reset()
+                    elapsed, latencies, errors = asyncio.run(run_level(base_url, concurrency, rounds))
+                    rows.append((label, concurrency, len(latencies) / elapsed, latencies, errors, graph.peak))
+
+    print(f"\n{'=' * 84}")
+    print(f"/api/chat   simulated pipeline latency: {latency_ms:.0f} ms   requests per client: {rounds}")
+    print(f"{'-' * 84}")
+    print(f"{'server':<22}{'clients':>8}{'req/s':>10}{'p50 (ms)':>11}{'p95 (ms)':>11}{'max (ms)':>11}{'errors':>8}{'in flight':>11}")
+    for label, concurrency, rps, latencies, errors, peak in rows:
+        print(
+            f"{label:<22}{concurrency:>8}{rps:>10.1f}{_pct(latencies, 0.5) * 1000:>11.0f}"
+            f"{_pct(latencies, 0.95) * 1000:>11.0f}{max(latencies, default=float('nan')) * 1000:>11.0f}"
+            f"{errors:>8}{peak:>11}"
+        )
+    print(f"{'=' * 84}")
+    print("'in flight' is the peak number of requests inside the pipeline at once: the")
+    print("per-process concurrency each server sustained. Above that, requests queue.")
+    print(f"Flask ceiling: threads / latency = {flask_threads / (latency_ms / 1000):.0f} req/s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels", default="1,16,64,256", help="comma-separated client counts")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--flask-threads", type=int, default=8)
+    args = parser.parse_args()
+    main([int(n) for n in args.levels.split(",")], args.rounds, args.latency_ms, args.flask_threads)
@@ -0,0 +1,205 @@
+"""
+Benchmark for the pooled HTTP client layer (http_client.py).
+
+Runs the non-LLM part of the planner pipeline (run_step2 -> process_spots ->
+optimize_day_plan -> run_itinerary_pipeline) against local stand-in servers for
+Places, Distance Matrix, Directions and OpenWeather, once with keep-alive
+pooling and once with a fresh connection per request (the old behaviour), and
+prints handshake counts and wall-clock for both.
+
+Usage:
+    python bench_http_client.py [--runs 5] [--latency-ms 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import tempfile
+import time
+
+from aiohttp import web
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+PORT = _free_port()
+os.environ["GOOGLE_MAPS_BASE_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ["OPENWEATHER_BASE_URL"] = f"http://127.0.0.1:{PORT}"
+# The stand-ins ignore the keys, but without them the pipeline skips the calls.
+os.environ["GOOGLE_MAPS_API_KEY"] = "bench-key"
+os.environ["OPENWEATHER_API_KEY"] = "bench-key"
+# Measure the network path: throwaway cache file whose entries expire immediately.
+os.environ["PLANNER_CACHE_DB"] = os.path.join(tempfile.mkdtemp(), "bench_cache.sqlite3")
+os.environ["PLACES_SEARCH_TTL_SEC"] = "0"
+os.environ["PLACES_DETAILS_TTL_SEC"] = "0"
+os.environ["DM_CACHE_TTL_SEC"] = "0"
+os.environ["WEATHER_CACHE_TTL_SEC"] = "0"
+# ...and the connection layer only: lift the per-upstream quotas out of the way.
+for _name in ("PLACES", "DISTANCE_MATRIX", "DIRECTIONS", "OPENWEATHER"):
+    os.environ[f"RATE_LIMIT_{_name}_QPS"] = "100000"
+    os.environ[f"RATE_LIMIT_{_name}_BURST"] = "100000"
+    os.environ[f"RATE_LIMIT_{_name}_CONCURRENCY"] = "1000"
+
+import http_client  # noqa: E402
+import planner  # noqa: E402
+
+CENTER = (15.4909, 73.8278)  # Goa
+
+
+# -------------------------
+# STAND-IN UPSTREAMS
+# -------------------------
+def build_stub_app(latency_sec: float) -> web.Application:
+    rng = random.Random(42)
+    places = {}
+
+    async def text_search(request):
+        await asyncio.sleep(latency_sec)
+        query = request.query["query"]
+        results = []
+        for i in range(20):
+            place_id = f"{abs(hash(query)) % 10_000}-{i}"
+            places.setdefault(place_id, (
+                CENTER[0] + rng.uniform(-0.4, 0.4),
+                CENTER[1] + rng.uniform(-0.4, 0.4),
+            ))
+            results.append({"place_id": place_id, "rating": 4.2})
+        return web.json_response({"status": "OK", "results": results})
+
+    async def details(request):
+        await asyncio.sleep(latency_sec)
+        place_id = request.query["place_id"]
+        lat, lng = places.get(place_id, CENTER)
+        return web.json_response({"status": "OK", "result": {
+            "place_id": place_id,
+            "name": f"Spot {place_id}",
+            "geometry": {"location": {"lat": lat, "lng": lng}},
+            "rating": 4.2,
+            "types": ["tourist_attraction"],
+            "opening_hours": {"open_now": True},
+        }})
+
+    def _parse(points):
+        return [tuple(map(float, p.split(","))) for p in points.split("|")]
+
+    async def distance_matrix(request):
+        await asyncio.sleep(latency_sec)
+        rows = []
+        for o in _parse(request.query["origins"]):
+            elements = []
+            for d in _parse(request.query["destinations"]):
+                km = planner.haversine_km(o[0], o[1], d[0], d[1]) * 1.3
+                elements.append({
+                    "status": "OK",
+                    "distance": {"value": int(km * 1000)},
+                    "duration": {"value": int(km / 40 * 3600)},
+                })
+            rows.append({"elements": elements})
+        return web.json_response({"status": "OK", "rows": rows})
+
+    async def directions(request):
+        await asyncio.sleep(latency_sec)
+        waypoints = request.query["waypoints"].split("|")[1:]
+        return web.json_response({"status": "OK", "routes": [{
+            "waypoint_order": list(range(len(waypoints))),
+            "overview_polyline": {"points": "_p~iF~ps|U_ulLnnqC"},
+        }]})
+
+    async def weather(request):
+        await asyncio.sleep(latency_sec)
+        return web.json_response({"weather": [{"main": "Clear"}]})
+
+    app = web.Application()
+    app.router.add_get("/maps/api/place/textsearch/json", text_search)
+    app.router.add_get("/maps/api/place/details/json", details)
+    app.router.add_get("/maps/api/distancematrix/json", distance_matrix)
+    app.router.add_get("/maps/api/directions/json", directions)
+    app.router.add_get("/data/2.5/weather", weather)
+    return app
+
+
+# -------------------------
+# PIPELINE RUN
+# -------------------------
+def plans_from_day_plan(day_plan, count=3):
+    """Stand-in for the LLM step: turn the optimizer output into `count` plans."""
+    hotel = day_plan["hotel_location"]
+    days = {k: v for k, v in day_plan.items() if k.startswith("Day ")}
+    plans = []
+    for n in range(count):
+        plans.append({
+            "itinerary_name": f"Bench plan {n + 1}",
+            "hotel": hotel,
+            "itinerary": {
+                day: [{"spot_name": s["name"], "lat": s["lat"], "long": s["lng"]} for s in spots[:3]]
+                for day, spots in days.items()
+            },
+        })
+    return plans
+
+
+async def run_pipeline_once(trip):
+    step2 = await planner.run_step2(trip)
+    step3 = await planner.process_spots(step2)
+    day_plan = planner.optimize_day_plan(step2, step3)
+    await planner.run_itinerary_pipeline(plans_from_day_plan(day_plan))
+
+
+async def run_mode(keepalive: bool, runs: int, trip):
+    http_client.HTTP_KEEPALIVE = keepalive
+    await http_client.close_session()
+    http_client.reset_http_stats()
+
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        await run_pipeline_once(trip)
+    elapsed = time.perf_counter() - t0
+
+    await http_client.close_session()
+    return elapsed, http_client.get_http_stats()
+
+
+async def main(runs: int, latency_ms: float):
+    runner = web.AppRunner(build_stub_app(latency_ms / 1000))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+    trip = {
+        "destination": "Goa",
+        "max_spots": 21,
+        "search_keywords": {"primary": "beaches", "secondary": "forts", "extra": "nightlife"},
+    }
+
+    results = {}
+    try:
+        for label, keepalive in (("per-request connections", False), ("pooled keep-alive", True)):
+            results[label] = await run_mode(keepalive, runs, trip)
+    finally:
+        await runner.cleanup()
+
+    print(f"\n{'=' * 72}")
+    print(f"Pipeline runs: {runs}   simulated upstream latency: {latency_ms:.0f} ms")
+    print(f"{'-' * 72}")
+    print(f"{'mode':<26}{'wall (s)':>10}{'requests':>11}{'handshakes':>12}{'reused':>9}")
+    for label, (elapsed, stats) in results.items():
+        print(
+            f"{label:<26}{elapsed:>10.2f}{stats['requests']:>11}"
+            f"{stats['connections_created']:>12}{stats['connections_reused']:>9}"
+        )
+    print(f"{'=' * 72}")
+    print("Handshakes are counted client-side (one per new TCP connection; against the")
+    print("real HTTPS upstreams each one is a TCP + TLS handshake).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+    planner.OUTPUT_FILE = os.devnull
+    asyncio.run(main(args.runs, args.latency_ms))
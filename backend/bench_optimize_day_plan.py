@@ -0,0 +1,159 @@
+"""
+Benchmark for optimize_day_plan on synthetic spot pools.
+
+Compares the previous list/dict implementation with the index-based one, with
+and without the 2-opt / Or-opt pass, for growing pool sizes. The greedy-only
+run must reproduce the legacy plan exactly.
+
+Usage:
+    python bench_optimize_day_plan.py [--sizes 24 100 250 500 1000] [--budget 0.5]
+"""
+import argparse
+import contextlib
+import copy
+import io
+import random
+import time
+
+import numpy as np
+
+import planner
+
+
+def synthetic_pool(n, seed=7):
+    """
+    n spots around Goa with a complete spot ➜ spot matrix (40 km/h, 1.3x detour),
+    both name-keyed and as the array process_spots returns alongside it.
+    """
+    rng = random.Random(seed)
+    hotel = {"name": "Hotel", "lat": 15.49, "lng": 73.82}
+    spots = []
+    for i in range(n):
+        lat, lng = 15.49 + rng.uniform(-0.6, 0.6), 73.82 + rng.uniform(-0.6, 0.6)
+        km = planner.haversine_km(hotel["lat"], hotel["lng"], lat, lng) * 1.3
+        spots.append({
+            "name": f"Spot {i}",
+            "distance_from_hotel_km": round(km, 2),
+            "travel_time_min": round(km / 40 * 60, 1),
+            "lat": lat,
+            "lng": lng,
+            "matrix_index": i,
+        })
+
+    matrix = {}
+    minutes = np.zeros((n, n))
+    for i, a in enumerate(spots):
+        row = {}
+        for j, b in enumerate(spots):
+            if a is b:
+                continue
+            km = planner.haversine_km(a["lat"], a["lng"], b["lat"], b["lng"]) * 1.3
+            row[b["name"]] = {"distance_km": round(km, 1), "time_min": round(km / 40 * 60, 1)}
+            minutes[i, j] = row[b["name"]]["time_min"]
+        matrix[a["name"]] = row
+
+    step2 = {"hotel_location": hotel}
+    step3 = {
+        "spots_distance_features": spots,
+        "distance_matrix": matrix,
+        "travel_time_matrix_min": minutes,
+        "travel_constraints": {"max_daily_travel_min": planner.MAX_DAILY_TRAVEL_MIN},
+    }
+    return step2, step3
+
+
+def legacy_optimize_day_plan(step2_data, step3_data):
+    """The implementation optimize_day_plan replaced, kept here as the baseline."""
+    hotel = step2_data["hotel_location"]
+    spots = step3_data["spots_distance_features"]
+    distance_matrix = step3_data["distance_matrix"]
+    max_daily_travel_min = step3_data["travel_constraints"]["max_daily_travel_min"]
+
+    spots.sort(key=lambda x: x["distance_from_hotel_km"])
+    days_output = {}
+    current_day = 1
+    remaining_spots = spots[:]
+    precomputed = {loc: distance_matrix.get(loc, {}) for loc in distance_matrix}
+
+    while remaining_spots:
+        day_key = f"Day {current_day}"
+        days_output[day_key] = []
+        travel_used = 0
+        current_loc = "hotel"
+
+        while remaining_spots:
+            if current_loc == "hotel":
+                next_spot = remaining_spots[0]
+                travel_time = next_spot["travel_time_min"]
+            else:
+                lookup = precomputed.get(current_loc, {})
+                next_spot = min(
+                    remaining_spots,
+                    key=lambda s: lookup.get(s["name"], {}).get("time_min", 999999)
+                )
+                travel_time = lookup.get(next_spot["name"], {}).get("time_min", 0)
+
+            if travel_used + travel_time > max_daily_travel_min:
+                break
+
+            travel_used += travel_time
+            days_output[day_key].append({"name": next_spot["name"], "lat": next_spot["lat"], "lng": next_spot["lng"]})
+            current_loc = next_spot["name"]
+            remaining_spots.remove(next_spot)
+
+        current_day += 1
+
+    days_output["hotel_location"] = hotel
+    return days_output
+
+
+def total_travel_min(plan, step3):
+    """Sum of hotel ➜ first spot and spot ➜ spot minutes over all days."""
+    features = {s["name"]: s for s in step3["spots_distance_features"]}
+    matrix = step3["distance_matrix"]
+    total = 0.0
+    for day, stops in plan.items():
+        if not day.startswith("Day "):
+            continue
+        prev = None
+        for stop in stops:
+            if prev is None:
+                total += features[stop["name"]]["travel_time_min"]
+            else:
+                total += matrix[prev].get(stop["name"], {}).get("time_min", 0)
+            prev = stop["name"]
+    return total
+
+
+def timed(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        return out, time.perf_counter() - t0
+
+
+def main(sizes, budget):
+    print(f"\n{'=' * 86}")
+    print(f"{'spots':>6}{'legacy (s)':>12}{'greedy (s)':>12}{'+local (s)':>12}"
+          f"{'legacy min':>12}{'+local min':>12}{'days':>8}{'same plan':>11}")
+    print(f"{'-' * 86}")
+    for n in sizes:
+        step2, step3 = synthetic_pool(n)
+        legacy, t_legacy = timed(legacy_optimize_day_plan, step2, copy.deepcopy(step3))
+        greedy, t_greedy = timed(planner.optimize_day_plan, step2, copy.deepcopy(step3), improve=False)
+        local, t_local = timed(planner.optimize_day_plan, step2, copy.deepcopy(step3), True, budget)
+        print(
+            f"{n:>6}{t_legacy:>12.3f}{t_greedy:>12.3f}{t_local:>12.3f}"
+            f"{total_travel_min(legacy, step3):>12.0f}{total_travel_min(local, step3):>12.0f}"
+            f"{len(local) - 1:>8}{str(legacy == greedy):>11}"
+        )
+    print(f"{'=' * 86}")
+    print(f"Local search budget: {budget}s. Matrix build for the pool is not timed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[24, 100, 250, 500, 1000])
+    parser.add_argument("--budget", type=float, default=planner.OPTIMIZER_TIME_BUDGET_SEC)
+    args = parser.parse_args()
+    main(args.sizes, args.budget)
@@ -0,0 +1,174 @@
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from http_client import get_session
+from retry import get_json_with_retry
+from sqlite_cache import SqliteTTLCache
+load_dotenv()
+
+# -------------------------
+# CONFIG
+# -------------------------
+GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com")
+DM_MAX_ELEMENTS = int(os.getenv("DM_MAX_ELEMENTS", "100"))  # origins x destinations per request
+DM_MAX_SIDE = int(os.getenv("DM_MAX_SIDE", "25"))  # max origins (and destinations) per request
+DM_SYMMETRIC = os.getenv("DM_SYMMETRIC", "0") == "1"  # fetch only A➜B and mirror it to B➜A
+DM_CACHE_TTL_SEC = int(os.getenv("DM_CACHE_TTL_SEC", str(7 * 24 * 3600)))
+DM_CACHE_MAX_ENTRIES = int(os.getenv("DM_CACHE_MAX_ENTRIES", "200000"))
+DM_CACHE_COORD_DECIMALS = 4  # ~11 m; points closer than that share travel times
+
+# Directional A➜B travel times, shared by all workers (see sqlite_cache.py).
+pair_cache = SqliteTTLCache("distance_pairs", DM_CACHE_TTL_SEC, DM_CACHE_MAX_ENTRIES)
+
+
+def point_key(lat: float, lng: float, place_id: Optional[str] = None) -> str:
+    """Cache identity of a matrix point: its place id, else its rounded coordinates."""
+    if place_id:
+        return f"id:{place_id}"
+    return f"ll:{round(lat, DM_CACHE_COORD_DECIMALS)},{round(lng, DM_CACHE_COORD_DECIMALS)}"
+
+
+# -------------------------
+# SINGLE REQUEST
+# -------------------------
+async def build_distance_matrix_async(
+    origins: List[Tuple[float, float]], destinations: List[Tuple[float, float]]
+) -> Dict:
+    """Asynchronous Google Distance Matrix API call."""
+    url = f"{GOOGLE_MAPS_BASE_URL}/maps/api/distancematrix/json"
+    origin_str = "|".join([f"{lat},{lng}" for lat, lng in origins])
+    dest_str = "|".join([f"{lat},{lng}" for lat, lng in destinations])
+    params = {
+        "origins": origin_str,
+        "destinations": dest_str,
+        "key": GOOGLE_MAPS_API_KEY,
+        "units": "metric",
+    }
+
+    session = get_session()
+    return await get_json_with_retry(session, url, params, upstream="distance_matrix", attempt_timeout_sec=20)
+
+
+# -------------------------
+# TILING
+# -------------------------
+def plan_tiles(need: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Pack the needed (origin, destination) cells into request tiles.
+
+    Destinations are split into chunks of DM_MAX_SIDE; within a chunk, origins are
+    grouped greedily while rows x columns stays within DM_MAX_ELEMENTS. Returns a
+    list of (origin_indices, destination_indices).
+    """
+    tiles = []
+    col_ids = np.flatnonzero(need.any(axis=0))
+
+    for c0 in range(0, len(col_ids), DM_MAX_SIDE):
+        cols = col_ids[c0:c0 + DM_MAX_SIDE]
+        sub = need[:, cols]
+
+        rows, row_cols = [], np.zeros(len(cols), dtype=bool)
+        for r in np.flatnonzero(sub.any(axis=1)):
+            merged = row_cols | sub[r]
+            if rows and ((len(rows) + 1) * merged.sum() > DM_MAX_ELEMENTS or len(rows) == DM_MAX_SIDE):
+                tiles.append((np.array(rows), cols[row_cols]))
+                rows, merged = [], sub[r].copy()
+            rows.append(r)
+            row_cols = merged
+
+        if rows:
+            tiles.append((np.array(rows), cols[row_cols]))
+
+    return tiles
+
+
+async def _fetch_tile(points, rows, cols, distance_m, duration_s):
+    origins = [points[i] for i in rows]
+    destinations = [points[j] for j in cols]
+    try:
+        dm = await build_distance_matrix_async(origins, destinations)
+        for r, row in zip(rows, dm["rows"]):
+            for c, el in zip(cols, row["elements"]):
+                if el.get("status") != "OK":
+                    continue
+                distance_m[r, c] = el["distance"]["value"]
+                duration_s[r, c] = el["duration"]["value"]
+    except Exception as e:
+        print(f"❌ Distance Matrix tile {len(rows)}x{len(cols)} failed: {e}")
+
+
+async def build_travel_matrix(
+    points: List[Tuple[float, float]],
+    need: Optional[np.ndarray] = None,
+    symmetric: bool = DM_SYMMETRIC,
+    keys: Optional[List[str]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fetch an N×N travel matrix for `points` using as few requests as the API limits allow.
+
+    `need` marks the cells to fetch (default: every off-diagonal cell). With
+    `symmetric=True` only the upper triangle is requested and mirrored. When
+    `keys` (one `point_key` per point) are given, cached pairs are filled in
+    first and only the missing ones are requested.
+    Returns (distance_m, duration_s) float arrays; unknown cells are NaN and the
+    diagonal is 0.
+    """
+    n = len(points)
+    if need is None:
+        need = ~np.eye(n, dtype=bool)
+    need = need.copy()
+    np.fill_diagonal(need, False)
+    if symmetric:
+        need = np.triu(need | need.T)
+
+    distance_m = np.full((n, n), np.nan)
+    duration_s = np.full((n, n), np.nan)
+    np.fill_diagonal(distance_m, 0.0)
+    np.fill_diagonal(duration_s, 0.0)
+
+    cached = 0
+    if keys is not None:
+        cached = await _fill_from_cache(keys, need, distance_m, duration_s)
+        need &= np.isnan(distance_m)
+
+    tiles = plan_tiles(need)
+    elements = sum(len(r) * len(c) for r, c in tiles)
+    print(f"📦 Distance Matrix: {cached} cached, {int(need.sum())} cells in {len(tiles)} request(s), {elements} elements")
+
+    await asyncio.gather(*[_fetch_tile(points, r, c, distance_m, duration_s) for r, c in tiles])
+
+    if keys is not None:
+        await _store_in_cache(keys, need, distance_m, duration_s)
+
+    if symmetric:
+        mirror = np.isnan(distance_m) & ~np.isnan(distance_m.T)
+        distance_m[mirror] = distance_m.T[mirror]
+        duration_s[mirror] = duration_s.T[mirror]
+
+    return distance_m, duration_s
+
+
+# -------------------------
+# PAIR CACHE
+# -------------------------
+async def _fill_from_cache(keys, need, distance_m, duration_s) -> int:
+    rows, cols = np.nonzero(need)
+    pair_keys = [f"{keys[i]}>{keys[j]}" for i, j in zip(rows, cols)]
+    found = await pair_cache.aget_many(pair_keys)
+    for i, j, k in zip(rows, cols, pair_keys):
+        hit = found.get(k)
+        if hit is not None:
+            distance_m[i, j], duration_s[i, j] = hit
+    return len(found)
+
+
+async def _store_in_cache(keys, fetched, distance_m, duration_s):
+    rows, cols = np.nonzero(fetched & ~np.isnan(distance_m))
+    await pair_cache.aset_many({
+        f"{keys[i]}>{keys[j]}": [float(distance_m[i, j]), float(duration_s[i, j])]
+        for i, j in zip(rows, cols)
+    })
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import threading
+
+# -------------------------
+# PROCESS-WIDE EVENT LOOP
+# -------------------------
+# Sync callers (Flask views, background jobs) hand their coroutines to
+# `run_sync` instead of `asyncio.run`, so loop-bound state such as the pooled
+# HTTP sessions in http_client.py lives for the whole worker, not one call.
+
+_loop = None
+_loop_pid = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the background loop, starting it on first use (once per worker process)."""
+    global _loop, _loop_pid
+    with _lock:
+        # Gunicorn forks workers after import, and threads do not survive a fork.
+        if _loop is None or _loop.is_closed() or _loop_pid != os.getpid():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="planner-event-loop", daemon=True)
+            thread.start()
+            _loop = loop
+            _loop_pid = os.getpid()
+        return _loop
+
+
+def run_sync(coro, timeout=None):
+    """Run a coroutine on the background loop and block until it finishes."""
+    loop = get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_sync() called from the background loop itself; await the coroutine instead.")
+
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+
+def iterate_sync(async_iterable, timeout=None):
+    """Iterate an async iterable (e.g. a LangGraph `astream`) from sync code, one item per run_sync."""
+    iterator = async_iterable.__aiter__()
+
+    async def next_item():
+        return await iterator.__anext__()
+
+    async def close():
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    try:
+        while True:
+            try:
+                yield run_sync(next_item(), timeout)
+            except StopAsyncIteration:
+                return
+    finally:
+        # Also runs when the consumer stops early (e.g. an SSE client went away).
+        run_sync(close(), timeout)
@@ -0,0 +1,177 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import AsyncContextManager, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# -------------------------
+# CONFIG
+# -------------------------
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "0") == "1"  # opt-in; latencies are recorded either way
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))  # send the duplicate after this percentile
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))  # extra requests as a share of all requests
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))  # no hedging until the histogram has these
+HEDGE_MIN_DELAY_SEC = 0.02
+HEDGE_DECAY_EVERY = 1000  # halve the histogram after this many samples so it tracks recent latency
+
+# Log-spaced latency buckets: 5 ms … ~42 s, ~10 % wide.
+_BUCKET_BASE = 0.005
+_BUCKET_GROWTH = 1.1
+_BUCKET_COUNT = 96
+
+
+class LatencyHistogram:
+    """Decaying log-bucket histogram of one endpoint's latencies."""
+
+    def __init__(self):
+        self._counts = [0.0] * _BUCKET_COUNT
+        self._samples = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bucket(sec: float) -> int:
+        if sec <= _BUCKET_BASE:
+            return 0
+        return min(_BUCKET_COUNT - 1, int(math.log(sec / _BUCKET_BASE, _BUCKET_GROWTH)) + 1)
+
+    def record(self, sec: float):
+        with self._lock:
+            self._counts[self._bucket(sec)] += 1
+            self._samples += 1
+            if self._samples % HEDGE_DECAY_EVERY == 0:
+                self._counts = [c / 2 for c in self._counts]
+
+    def count(self) -> float:
+        with self._lock:
+            return sum(self._counts)
+
+    def percentile(self, p: float) -> float:
+        """Upper edge of the bucket holding the p-th percentile, in seconds (0 when empty)."""
+        with self._lock:
+            total = sum(self._counts)
+            if not total:
+                return 0.0
+            target, seen = total * p / 100, 0.0
+            for i, c in enumerate(self._counts):
+                seen += c
+                if seen >= target:
+                    return _BUCKET_BASE * _BUCKET_GROWTH ** i
+            return _BUCKET_BASE * _BUCKET_GROWTH ** (_BUCKET_COUNT - 1)
+
+
+class Hedger:
+    """Latency histogram, hedge threshold and hedge budget for one endpoint."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.histogram = LatencyHistogram()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "over_budget": 0, "no_quota": 0}
+
+    def threshold(self) -> float:
+        return max(HEDGE_MIN_DELAY_SEC, self.histogram.percentile(HEDGE_PERCENTILE))
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self._stats["hedged"] + 1 > HEDGE_MAX_RATIO * self._stats["requests"]:
+                self._stats["over_budget"] += 1
+                return False
+            self._stats["hedged"] += 1
+            return True
+
+    def _refund_budget(self):
+        with self._lock:
+            self._stats["hedged"] -= 1
+            self._stats["no_quota"] += 1
+
+    async def run(self, make_attempt: Callable[[], Awaitable], admit: Optional[Callable[[], AsyncContextManager]] = None):
+        self._count("requests")
+        start = time.monotonic()
+        if not HEDGING_ENABLED or self.histogram.count() < HEDGE_MIN_SAMPLES:
+            result = await make_attempt()
+            self.histogram.record(time.monotonic() - start)
+            return result
+
+        primary = asyncio.ensure_future(make_attempt())
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.threshold())
+            if not done and self._take_budget():
+                async with admit() if admit else nullcontext(True) as admitted:
+                    if admitted:
+                        hedge_start = time.monotonic()
+                        hedge = asyncio.ensure_future(make_attempt())
+                        pending = {primary, hedge}
+                        return await self._race(primary, hedge, start, hedge_start, pending)
+                self._refund_budget()
+
+            result = await primary
+            self.histogram.record(time.monotonic() - start)
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _race(self, primary, hedge, start: float, hedge_start: float, pending: set):
+        while True:
+            done, still_pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.intersection_update(still_pending)  # the caller cancels whatever is left
+            winner = next((t for t in done if t.exception() is None), None)
+            if winner is None and pending:
+                continue  # one copy failed; the other may still answer
+            if winner is None:
+                return next(iter(done)).result()  # both failed: raise
+            if winner is hedge:
+                self._count("hedge_wins")
+            self.histogram.record(time.monotonic() - (hedge_start if winner is hedge else start))
+            return winner.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["threshold_ms"] = round(self.threshold() * 1000, 1)
+        stats["p50_ms"] = round(self.histogram.percentile(50) * 1000, 1)
+        stats["p99_ms"] = round(self.histogram.percentile(99) * 1000, 1)
+        return stats
+
+
+_hedgers: Dict[str, Hedger] = {}
+_hedgers_lock = threading.Lock()
+
+
+def hedger(name: str) -> Hedger:
+    with _hedgers_lock:
+        h = _hedgers.get(name)
+        if h is None:
+            h = _hedgers[name] = Hedger(name)
+        return h
+
+
+async def hedged(name: str, make_attempt: Callable[[], Awaitable], admit: Optional[Callable[[], AsyncContextManager]] = None):
+    """
+    Await `make_attempt()`, sending a second copy if the first is slower than
+    the endpoint's HEDGE_PERCENTILE latency; the first good answer wins.
+
+    Only runs the extra copy when HEDGING_ENABLED and within HEDGE_MAX_RATIO of
+    the endpoint's traffic. `make_attempt` must be safe to run twice (idempotent GETs)
+    and should cover the network request only: its duration feeds the histogram,
+    so acquire rate limits before calling this. `admit()` is entered around the
+    extra copy and yields False to skip it (e.g. Upstream.try_limit when the
+    quota has no room right now).
+    """
+    return await hedger(name).run(make_attempt, admit)
+
+
+def get_hedging_stats() -> dict:
+    with _hedgers_lock:
+        names = list(_hedgers)
+    return {"enabled": HEDGING_ENABLED, "endpoints": {n: hedger(n).stats() for n in names}}
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import aiohttp
+from aiohttp import ClientTimeout
+from dotenv import load_dotenv
+load_dotenv()
+
+# -------------------------
+# CONFIG
+# -------------------------
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))  # total open connections
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))  # per upstream host
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))  # seconds
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))  # idle seconds before close
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "20"))  # default total timeout per request
+HTTP_KEEPALIVE = os.getenv("HTTP_KEEPALIVE", "1") != "0"  # "0" = new connection per request
+
+
+# One pooled session per event loop. In the app this is the single loop from
+# event_loop.py; scripts that use asyncio.run() simply get their own.
+_sessions: dict = {}
+
+_stats = {
+    "requests": 0,
+    "connections_created": 0,  # each one is a TCP (+TLS) handshake
+    "connections_reused": 0,
+    "dns_lookups": 0,
+    "dns_cache_hits": 0,
+}
+
+
+async def _on_request_start(session, ctx, params):
+    _stats["requests"] += 1
+
+
+async def _on_connection_create_end(session, ctx, params):
+    _stats["connections_created"] += 1
+
+
+async def _on_connection_reuseconn(session, ctx, params):
+    _stats["connections_reused"] += 1
+
+
+async def _on_dns_resolvehost_end(session, ctx, params):
+    _stats["dns_lookups"] += 1
+
+
+async def _on_dns_cache_hit(session, ctx, params):
+    _stats["dns_cache_hits"] += 1
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(_on_request_start)
+    trace.on_connection_create_end.append(_on_connection_create_end)
+    trace.on_connection_reuseconn.append(_on_connection_reuseconn)
+    trace.on_dns_resolvehost_end.append(_on_dns_resolvehost_end)
+    trace.on_dns_cache_hit.append(_on_dns_cache_hit)
+    return trace
+
+
+def _create_session() -> aiohttp.ClientSession:
+    if HTTP_KEEPALIVE:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+    else:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            force_close=True,
+        )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=ClientTimeout(total=HTTP_TIMEOUT),
+        trace_configs=[_trace_config()],
+    )
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the shared pooled session for the running event loop. Never close it yourself."""
+    loop = asyncio.get_running_loop()
+
+    # Forget sessions whose loop is gone (e.g. after an asyncio.run() in a script).
+    for old_loop in [l for l in _sessions if l.is_closed()]:
+        del _sessions[old_loop]
+
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = _create_session()
+        _sessions[loop] = session
+    return session
+
+
+async def close_session():
+    """Close the session of the running loop (shutdown hooks, benchmarks)."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def get_http_stats() -> dict:
+    return dict(_stats)
+
+
+def reset_http_stats():
+    for key in _stats:
+        _stats[key] = 0
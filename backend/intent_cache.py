@@ -0,0 +1,127 @@
+import os
+import re
+from datetime import date
+from typing import Awaitable, Callable, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+from sqlite_cache import SqliteTTLCache
+
+# -------------------------
+# CONFIG
+# -------------------------
+INTENT_CACHE_TTL_SEC = int(os.getenv("INTENT_CACHE_TTL_SEC", str(6 * 3600)))
+INTENT_CACHE_MAX_ENTRIES = int(os.getenv("INTENT_CACHE_MAX_ENTRIES", "20000"))
+
+# planner.py (/api/chat) and re_planner.py (/api/enhance) use different prompts, so separate tables.
+trip_intent_cache = SqliteTTLCache("trip_intent", INTENT_CACHE_TTL_SEC, INTENT_CACHE_MAX_ENTRIES)
+enhance_intent_cache = SqliteTTLCache("trip_intent_enhance", INTENT_CACHE_TTL_SEC, INTENT_CACHE_MAX_ENTRIES)
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fourteen": 14, "fifteen": 15, "twenty": 20,
+    "thirty": 30, "a": 1, "an": 1, "couple": 2,
+}
+UNITS = {
+    "day": "day", "days": "day", "night": "night", "nights": "night", "week": "week", "weeks": "week",
+    "people": "people", "persons": "people", "person": "people", "members": "people", "member": "people",
+    "pax": "people", "adults": "people", "adult": "people", "friends": "people", "travelers": "people",
+    "travellers": "people",
+}
+STOP_WORDS = {
+    "a", "an", "the", "to", "for", "of", "in", "on", "at", "and", "with", "my", "me", "i", "we", "us",
+    "our", "please", "want", "wanna", "would", "like", "can", "you", "plan", "make", "create", "give",
+    "suggest", "trip", "tour", "travel", "itinerary", "vacation", "holiday", "visit", "go", "going",
+    "around", "some", "about", "budget", "rs", "inr", "rupees",
+}
+# Words that bind to the next non-stop token, so "from delhi" != "from goa" and
+# "not in goa" keeps its negation on goa. "to" binds only when the query names
+# an origin (see _to_is_directional); in "trip to goa" it is filler.
+BINDING_WORDS = {"from", "to", "no", "not", "without", "except", "avoid"}
+# Relative dates resolve against today, so they can only share a key within a day.
+RELATIVE_DATE_WORDS = {"today", "tomorrow", "tonight", "weekend", "next", "this", "coming"}
+
+
+def intent_key(prompt: str) -> str:
+    """
+    Order-insensitive key for a trip request.
+
+    '3 day trip to Goa' and 'Goa trip, three days' share a key; numbers stay
+    bound to their unit ('3_day', '2_people'), 'k' amounts are expanded and
+    'from X' / 'not X' stay bound to X, as does 'to X' after an origin
+    ('Delhi to Goa' != 'Goa to Delhi').
+    """
+    text = prompt.lower()
+    text = re.sub(r"(?<=\d),(?=\d)", "", text)  # 25,000 -> 25000
+    text = re.sub(r"(\d+(?:\.\d+)?)\s*k\b", lambda m: str(int(float(m.group(1)) * 1000)), text)
+    text = re.sub(r"(\d+(?:\.\d+)?)\s*(?:lakh|lac)s?\b", lambda m: str(int(float(m.group(1)) * 100000)), text)
+    raw = re.findall(r"[a-z]+|\d+", text)
+
+    words = [str(NUMBER_WORDS[w]) if w in NUMBER_WORDS and i + 1 < len(raw) and raw[i + 1] in UNITS else w
+             for i, w in enumerate(raw)]
+
+    tokens, relative, i = [], False, 0
+    while i < len(words):
+        w = words[i]
+        nxt = words[i + 1] if i + 1 < len(words) else None
+        relative |= w in RELATIVE_DATE_WORDS
+        if w.isdigit() and nxt in UNITS:
+            tokens.append(f"{int(w)}_{UNITS[nxt]}")
+            i += 2
+            continue
+        if w in BINDING_WORDS and (w != "to" or _to_is_directional(words, i)):
+            j = i + 1
+            while j < len(words) and words[j] in STOP_WORDS and words[j] not in BINDING_WORDS:
+                j += 1
+            if j < len(words) and words[j] not in BINDING_WORDS:
+                tokens.append(f"{w}_{words[j]}")
+                i = j + 1
+                continue
+        if w in UNITS:
+            tokens.append(UNITS[w])
+        elif w not in STOP_WORDS:
+            tokens.append(w)
+        i += 1
+
+    key = " ".join(sorted(tokens))
+    return f"{key}|{date.today().isoformat()}" if relative else key
+
+
+def _to_is_directional(words, i) -> bool:
+    """'to' at words[i] marks a destination after an origin: 'from X ... to Y' or 'X to Y'."""
+    if "from" in words[:i]:
+        return True
+    prev = words[i - 1] if i else None
+    return prev is not None and not prev.isdigit() and prev not in STOP_WORDS and prev not in UNITS and prev not in BINDING_WORDS
+
+
+async def cached_trip_details(
+    cache: SqliteTTLCache, prompt: str, extract: Callable[[str], Awaitable[Optional[BaseModel]]], model: Type[BaseModel]
+) -> Optional[BaseModel]:
+    """Return a validated `model` for `prompt`, awaiting `extract` (the LLM) only on a miss."""
+    key = intent_key(prompt)
+    cached = await cache.aget(key)
+    if cached is not None:
+        try:
+            return model.model_validate(cached)
+        except ValidationError as e:
+            print(f"⚠️ Dropping invalid cached intent for '{key}': {e}")
+
+    trip = await extract(prompt)
+    if trip is not None:
+        await cache.aset(key, trip.model_dump())
+    return trip
+
+
+def get_intent_cache_stats() -> dict:
+    return {"chat": trip_intent_cache.stats(), "enhance": enhance_intent_cache.stats()}
+
+
+if __name__ == "__main__":
+    # Key regressions: python intent_cache.py
+    assert intent_key("3 day trip to Goa") == intent_key("Goa trip, three days")
+    assert intent_key("trip to goa for 3 days") == intent_key("goa 3 days")
+    assert intent_key("Delhi to Goa 3 days") != intent_key("Goa to Delhi 3 days")
+    assert intent_key("from Delhi to Goa") != intent_key("from Goa to Delhi")
+    assert "not_goa" in intent_key("beach trip not in goa").split()
+    assert intent_key("I want to go to Goa") == intent_key("trip to goa")
+    print("✅ intent_key checks passed")
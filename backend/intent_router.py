@@ -0,0 +1,134 @@
+import math
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# -------------------------
+# CONFIG
+# -------------------------
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "1") == "1"
+INTENT_ROUTER_MIN_CONFIDENCE = float(os.getenv("INTENT_ROUTER_MIN_CONFIDENCE", "0.8"))  # below this, ask the LLM
+GREETING_MAX_WORDS = 6  # longer messages that start with "hi" are usually real requests
+
+# Weighted patterns per agent. A query's score for an agent is the sum of the
+# weights of its patterns that match; scores are turned into a confidence with
+# a softmax (see classify_intent). Weights are hand-tuned: ~3 for a word that
+# names the intent outright, 1–2 for supporting evidence.
+INTENT_FEATURES = {
+    "FlightBookingagent": [
+        (r"\bflights?\b", 3.0),
+        (r"\b(fly|flying|airlines?|airfare|air ticket|plane)\b", 2.5),
+        (r"\b(airport|iata|one[- ]way|round[- ]trip|economy|business class)\b", 1.0),
+    ],
+    "BusBookingAgent": [
+        (r"\bbus(es)?\b", 3.0),
+        (r"\b(volvo|sleeper|seater|redbus|ksrtc|msrtc|coach)\b", 2.0),
+        (r"\b(boarding point|dropping point)\b", 1.0),
+    ],
+    "AccomodationAgent": [
+        (r"\b(hotels?|resorts?|hostels?|homestays?|guest ?houses?|lodges?|motels?|airbnb|villas?)\b", 3.0),
+        (r"\b(accommodation|accomodation|lodging|place to stay|places to stay|where to stay|stays?)\b", 2.5),
+        (r"\b(rooms?|check[- ]?in|check[- ]?out|near(by)?)\b", 1.0),
+    ],
+    "Iterationagent": [
+        (r"\b(itinerar(y|ies)|trip plan|travel plan)\b", 3.5),
+        (r"\b\d+\s*(-\s*)?(days?|nights?|weeks?)\b|\b(one|two|three|four|five|six|seven|ten) (days?|nights?|weeks?)\b", 2.5),
+        (r"\b(plan|planning)\b", 2.0),
+        (r"\b(trip|tour|vacation|holiday|getaway|honeymoon|sightseeing)\b", 1.5),
+        (r"\b(things to do|places to visit|must[- ]see|explore)\b", 2.0),
+        (r"\b(budget|members|people|family|friends)\b", 0.5),
+    ],
+    "GeneralChatagent": [
+        (r"^\W*(hi|hello|hey|hiya|namaste|good (morning|afternoon|evening))\b", 3.0),
+        (r"\b(thanks|thank you|thx|bye|goodbye|see you)\b", 3.0),
+        (r"\b(who are you|what can you do|how are you|help me)\b", 2.5),
+    ],
+}
+# "from X to Y" is a journey: evidence for the transport agents, weak for a trip plan.
+ROUTE_PATTERN = re.compile(r"\bfrom\s+\w+.*\bto\s+\w+", re.IGNORECASE)
+ROUTE_WEIGHTS = {"FlightBookingagent": 1.0, "BusBookingAgent": 1.0, "Iterationagent": 0.5}
+
+# Agents that act on parameters the Supervisor's LLM call extracts: routing them locally still costs that call.
+AGENTS_NEEDING_EXTRACTION = {"BusBookingAgent", "AccomodationAgent"}
+
+_COMPILED = {agent: [(re.compile(p, re.IGNORECASE), w) for p, w in feats] for agent, feats in INTENT_FEATURES.items()}
+
+ROUTE_SOURCES = ("local", "local+extract", "llm")  # "local+extract": routed locally, LLM still called (AGENTS_NEEDING_EXTRACTION)
+
+_stats = {
+    "local": 0, "local+extract": 0, "llm": 0, "llm_agreed_with_guess": 0,
+    "local_by_agent": {}, "local+extract_by_agent": {}, "llm_by_agent": {},
+}
+_confidence_sum = {source: 0.0 for source in ROUTE_SOURCES}
+_lock = threading.Lock()
+
+
+def classify_intent(query: str) -> Tuple[str, float, Dict[str, float]]:
+    """Returns (best agent, confidence in 0..1, raw score per agent)."""
+    text = str(query or "")
+    scores = {agent: sum(w for pattern, w in feats if pattern.search(text)) for agent, feats in _COMPILED.items()}
+    if ROUTE_PATTERN.search(text):
+        for agent, w in ROUTE_WEIGHTS.items():
+            scores[agent] += w
+    if len(text.split()) > GREETING_MAX_WORDS:
+        scores["GeneralChatagent"] = 0.0
+
+    best = max(scores, key=scores.get)
+    if scores[best] == 0:
+        return best, 1 / len(scores), scores
+    total = sum(math.exp(s) for s in scores.values())
+    return best, math.exp(scores[best]) / total, scores
+
+
+def route_intent(query: str) -> Tuple[Optional[str], str, float]:
+    """
+    Returns (agent, best guess, confidence); agent is None when the query is
+    ambiguous and the Supervisor LLM should decide (then call record_llm_route).
+    """
+    guess, confidence, scores = classify_intent(query)
+    if not INTENT_ROUTER_ENABLED or confidence < INTENT_ROUTER_MIN_CONFIDENCE:
+        print(f"🧭 Intent router: unsure ({guess} {confidence:.2f}), asking the LLM | scores={_fmt(scores)}")
+        return None, guess, confidence
+
+    if guess in AGENTS_NEEDING_EXTRACTION:
+        _record("local+extract", guess, confidence)
+        print(f"🧭 Intent router: {guess} ({confidence:.2f}), LLM still extracts parameters | scores={_fmt(scores)}")
+    else:
+        _record("local", guess, confidence)
+        print(f"🧭 Intent router: {guess} ({confidence:.2f}) | scores={_fmt(scores)}")
+    return guess, guess, confidence
+
+
+def record_llm_route(guess: str, confidence: float, chosen: str):
+    """Log the LLM's choice next to the local guess, for tuning INTENT_FEATURES."""
+    _record("llm", chosen, confidence)
+    with _lock:
+        _stats["llm_agreed_with_guess"] += int(guess == chosen)
+    print(f"🧭 Intent router: LLM chose {chosen}, local guess was {guess} ({confidence:.2f})")
+
+
+def _record(source: str, agent: str, confidence: float):
+    with _lock:
+        _stats[source] += 1
+        by_agent = _stats[f"{source}_by_agent"]
+        by_agent[agent] = by_agent.get(agent, 0) + 1
+        _confidence_sum[source] += confidence
+
+
+def _fmt(scores: Dict[str, float]) -> str:
+    return ", ".join(f"{agent}={s:g}" for agent, s in scores.items() if s)
+
+
+def get_intent_router_stats() -> dict:
+    with _lock:
+        stats = {k: dict(v) if isinstance(v, dict) else v for k, v in _stats.items()}
+        for source in ROUTE_SOURCES:
+            n = _stats[source]
+            stats[f"avg_confidence_{source}"] = round(_confidence_sum[source] / n, 3) if n else None
+    stats["enabled"] = INTENT_ROUTER_ENABLED
+    stats["min_confidence"] = INTENT_ROUTER_MIN_CONFIDENCE
+    return stats
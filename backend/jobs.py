@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# -------------------------
+# CONFIG
+# -------------------------
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))  # pipelines running at once per process
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "32"))  # queued jobs before submit() refuses
+JOB_RESULT_TTL_SEC = int(os.getenv("JOB_RESULT_TTL_SEC", "900"))  # keep finished jobs this long
+
+
+class QueueFull(Exception):
+    """Raised by submit() when JOB_QUEUE_MAX jobs are already waiting."""
+
+
+# -------------------------
+# JOB MANAGER
+# -------------------------
+class JobManager:
+    """
+    Bounded background runner for long pipelines.
+
+    `submit(fn, *args)` returns a job id at once; `fn(*args, report)` runs on one
+    of `workers` threads and may call `report(stage)` to publish progress.
+    Finished jobs (result or error) are kept for `ttl_sec`, then dropped.
+    Jobs live in this process only: with several Gunicorn workers, poll through
+    a sticky session or run the job tier as a single process.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_max: int = JOB_QUEUE_MAX, ttl_sec: float = JOB_RESULT_TTL_SEC):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.ttl_sec = ttl_sec
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._stats = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Threads do not survive Gunicorn's fork; start the pool in the worker.
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="planner-job")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def submit(self, fn: Callable, *args, kind: str = "job") -> str:
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            if self._count("queued") >= self.queue_max:
+                self._stats["rejected"] += 1
+                raise QueueFull(f"{self.queue_max} jobs already queued")
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "stage": None,
+                "stages": [],
+                "created_at": now,
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            self._stats["submitted"] += 1
+            self._get_executor().submit(self._run, job_id, fn, args)
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable, args: tuple):
+        self._update(job_id, status="running", started_at=time.time())
+
+        def report(stage: str):
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    job["stage"] = stage
+                    job["stages"].append({"stage": stage, "at": time.time()})
+
+        try:
+            result = fn(*args, report)
+        except Exception as e:
+            print(f"❌ Job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+            with self._lock:
+                self._stats["failed"] += 1
+            return
+
+        self._update(job_id, status="done", result=result, finished_at=time.time())
+        with self._lock:
+            self._stats["succeeded"] += 1
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _count(self, status: str) -> int:
+        return sum(1 for job in self._jobs.values() if job["status"] == status)
+
+    def _sweep(self, now: float):
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and now - job["finished_at"] > self.ttl_sec
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of a job, or None if it is unknown or has expired."""
+        with self._lock:
+            self._sweep(time.time())
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {**job, "stages": list(job["stages"])}
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._sweep(time.time())
+            return {
+                **self._stats,
+                "queued": self._count("queued"),
+                "running": self._count("running"),
+                "retained": len(self._jobs),
+                "workers": self.workers,
+                "queue_max": self.queue_max,
+            }
+
+
+job_manager = JobManager()
@@ -0,0 +1,122 @@
+import json
+import re
+import threading
+from typing import Any, Optional, Tuple
+
+# -------------------------
+# CONFIG
+# -------------------------
+JSON_REPAIR_MAX_CUTS = 50  # dangling values dropped from a truncated answer before giving up
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+_stats = {"parsed": 0, "repaired_locally": 0, "llm_repairs": 0, "llm_repair_failures": 0}
+_stats_lock = threading.Lock()
+
+
+def count_repair(stat: str):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def loads_tolerant(text: str) -> Any:
+    """
+    json.loads that survives the usual LLM damage: code fences, text around the
+    JSON, trailing commas, stray or missing closing brackets and truncation.
+
+    A truncated answer loses only its unfinished last value. Raises ValueError
+    when nothing sensible can be recovered, so the caller can fall back to an
+    LLM repair.
+    """
+    try:
+        data = json.loads(text)
+        count_repair("parsed")
+        return data
+    except json.JSONDecodeError:
+        pass
+
+    data = repair_json(text)
+    if data is None:
+        raise ValueError("JSON could not be repaired locally")
+    count_repair("repaired_locally")
+    return data
+
+
+def repair_json(text: str) -> Optional[Any]:
+    text = _FENCE.sub("", text)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    text = text[min(starts):]
+
+    for _ in range(JSON_REPAIR_MAX_CUTS):
+        candidate, last_comma = _close(text)
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            if last_comma is None:
+                return None
+            text = text[:last_comma]  # drop the unfinished value and try again
+    return None
+
+
+def _close(text: str) -> Tuple[str, Optional[int]]:
+    """
+    Balance `text`: drop trailing commas and unmatched closers, stop after the
+    root value, close an open string and every open bracket. Also returns the
+    position of the last comma outside a string, where a retry can cut.
+    """
+    out, stack = [], []
+    in_string = escape = False
+    last_comma = None
+
+    for i, ch in enumerate(text):
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "[{":
+            stack.append("]" if ch == "[" else "}")
+        elif ch in "]}":
+            if not stack or stack[-1] != ch:
+                continue  # stray closer
+            _drop_trailing_comma(out)
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                break  # ignore anything after the root value
+            continue
+        elif ch == ",":
+            last_comma = i
+        out.append(ch)
+
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    _drop_trailing_comma(out)
+    tail = "".join(out).rstrip()
+    if tail.endswith(":"):
+        tail += "null"
+    return tail + "".join(reversed(stack)), last_comma
+
+
+def _drop_trailing_comma(out: list):
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i]
+
+
+def get_json_repair_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,53 @@
+from typing import List
+
+
+class JsonArrayStream:
+    """
+    Incremental scanner for a streamed JSON array of objects.
+
+    Feed it text as it arrives; `feed` returns the raw text of every top-level
+    object whose closing brace has now been seen, so callers can `json.loads`
+    (or repair) each element on its own. A bare top-level object (a model that
+    forgot the array) is returned the same way. Strings and escapes are
+    tracked, so braces inside values don't count.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._element_depth = None  # 1 inside "[...]", 0 for a bare object
+        self._start = None
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[str]:
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                if self._element_depth is None:
+                    self._element_depth = 1 if ch == "[" else 0
+                if ch == "{" and self._depth == self._element_depth:
+                    self._start = i
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+                if ch == "}" and self._depth == self._element_depth and self._start is not None:
+                    completed.append(text[self._start:i + 1])
+                    self._start = None
+        self._pos = len(text)
+        return completed
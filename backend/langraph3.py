@@ -1,14 +1,18 @@
 # travel_planner_graph.py (UPDATED)
+import copy
 import json
 import uuid
-from planner import get_structured_trip_details
+from planner import aget_structured_trip_details
 from planner import  run_step2
 from planner import  process_spots
 from planner import  optimize_day_plan
-from planner import  format_itinerary_with_llm
-from planner import  run_itinerary_pipeline
-from typing import TypedDict, Annotated, List, Literal, Any, Dict
+from planner import  plan_and_enrich
+from retry import request_with_retry
+from singleflight import intent_flight, itinerary_flight, normalize_query
+from intent_router import AGENTS_NEEDING_EXTRACTION, record_llm_route, route_intent
+from typing import TypedDict, Annotated, List, Literal, Any, Dict, Optional
 from langgraph.graph import StateGraph, START, END
+from langgraph.config import get_stream_writer
 from langgraph.graph.message import add_messages
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -113,7 +117,7 @@ def get_amadeus_token(client_id, client_secret):
     try:
         token_headers = {'Content-Type': 'application/x-www-form-urlencoded'}
         token_data = {'grant_type': 'client_credentials', 'client_id': client_id, 'client_secret': client_secret}
-        token_response = requests.post(TOKEN_URL, headers=token_headers, data=token_data)
+        token_response = request_with_retry("POST", TOKEN_URL, upstream="amadeus", headers=token_headers, data=token_data)
         token_response.raise_for_status()
         return token_response.json().get('access_token')
     except requests.exceptions.RequestException as e:
@@ -132,7 +136,7 @@ def get_iata_code_for_city(access_token, city_name):
         'view': 'FULL'
     }
     try:
-        iata_response = requests.get(LOCATION_SEARCH_URL, headers=iata_headers, params=iata_params)
+        iata_response = request_with_retry("GET", LOCATION_SEARCH_URL, upstream="amadeus", headers=iata_headers, params=iata_params)
         iata_response.raise_for_status()
         data = iata_response.json().get('data')
         return data[0].get('iataCode') if data and len(data) > 0 else None
@@ -181,9 +185,31 @@ def parse_booking_query(query: str) -> Dict[str, Any]:
     return params
 
 
+def merge_extracted_params(params: Dict[str, Any], extracted: Dict[str, Any]) -> Dict[str, Any]:
+    """Overlay the Supervisor's extracted parameters on the regex-parsed booking_params."""
+    merged = dict(params)
+    for key in ("origin", "destination", "address"):
+        if extracted.get(key):
+            merged[key] = extracted[key]
+    if extracted.get("date") and re.fullmatch(r"\d{4}-\d{2}-\d{2}", str(extracted["date"])):
+        merged["date"] = extracted["date"]
+    passengers = _positive_int(extracted.get("passengers"))
+    if passengers:  # "two" / "2 adults" from the LLM: keep the regex value
+        merged["adults"] = passengers
+    return merged
+
+
+def _positive_int(value) -> Optional[int]:
+    try:
+        number = float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() and number > 0 else None
+
+
 # --- 4. LANGGRAPH NODES (AGENTS) ---
 
-def initialagent(state: State) -> Command[Literal["Supervisor"]]:
+async def initialagent(state: State) -> Command[Literal["Supervisor"]]:
     """Sets the initial user query, parses booking params, and routes to the Supervisor."""
     user_query = state["messages"][-1].content
 
@@ -197,11 +223,26 @@ def initialagent(state: State) -> Command[Literal["Supervisor"]]:
                    update={"messages": [ai_msg], "user_query": user_query, "booking_params": booking_params})
 
 
-def Supervisor(state: State) -> Command[Literal["Iterationagent", "FlightBookingagent", "GeneralChatagent","BusBookingAgent", "AccomodationAgent", "END"]]:
+async def Supervisor(state: State) -> Command[Literal["Iterationagent", "FlightBookingagent", "GeneralChatagent","BusBookingAgent", "AccomodationAgent", "END"]]:
     # ... (Supervisor logic remains the same, but the FlightBookingagent description is more specific)
 
     messages = state["messages"]
 
+    booking_params = state.get("booking_params", {})
+
+    # Unambiguous queries ("flights from Delhi to Goa") are routed locally; the LLM only sees the rest,
+    # plus bus and hotel queries, whose agents need the parameters this one call extracts.
+    local_route, guess, confidence = route_intent(state["user_query"])
+    if local_route and local_route not in AGENTS_NEEDING_EXTRACTION:
+        log = {
+            "supervisor": {
+                "selected_agent": local_route,
+                "reasoning": f"Local intent router (confidence {confidence:.2f})"
+            }
+        }
+        messages.append(AIMessage(content=json.dumps(log)))
+        return Command(goto=local_route, update={"messages": messages})
+
     member_dict = {
         "Iterationagent": 'This agent is used to make or create an itinerary. Use this if the user asks for a plan, itinerary, or trip suggestion.',
         'FlightBookingagent': 'Specialized agent to **handle flight/train/bus booking queries**, transportation arrangements, and travel logistics. Use this if the user asks to **book, find options, or finalize a flight/trip** from one city to another.',
@@ -224,6 +265,11 @@ def Supervisor(state: State) -> Command[Literal["Iterationagent", "FlightBooking
             Literal[
                 "Iterationagent", "FlightBookingagent", "GeneralChatagent", "BusBookingAgent", "AccomodationAgent", "END"], "worker agent to route to next or route to END"]
         reasoning: Annotated[str, "Support proper reasoning for routing to the worker"]
+        origin: Annotated[Optional[str], "Departure city for a flight or bus query, else null"]
+        destination: Annotated[Optional[str], "Arrival city for a flight or bus query, else null"]
+        date: Annotated[Optional[str], "Travel date as YYYY-MM-DD if the user gave one, else null"]
+        address: Annotated[Optional[str], "Location or full address to search accommodation near, else null"]
+        passengers: Annotated[Optional[int], "Number of travellers if mentioned, else null"]
 
     prompt = f"""
         You are a supervisor Agent orchestrating a travel planning workflow.
@@ -233,6 +279,11 @@ def Supervisor(state: State) -> Command[Literal["Iterationagent", "FlightBooking
         {worker_info}
 
         Based on the current chat history (especially the user's latest query), what is the next logical step?
+
+        Also extract the parameters the chosen agent needs, exactly as the user gave them:
+        origin and destination cities for flights and buses, the travel date, the number of
+        passengers, and for accommodation the primary location or full address (the most
+        prominent one if several are mentioned). Use null for anything not mentioned.
         """
 
     m1 = [
@@ -243,14 +294,24 @@ The user's last message: {state["user_query"]}
     ]
 
     try:
-        result = llm.with_structured_output(Router).invoke(m1)
+        result = await llm.with_structured_output(Router).ainvoke(m1)
     except Exception as e:
         print(f"Supervisor LLM Error: {e}")
-        return Command(goto="END",
-                       update={"messages": messages + [AIMessage(content=f"Supervisor failed to route: {e}")]})
+        if local_route:
+            # The route is known; the agent falls back to the regex-parsed booking_params.
+            result = {"next": local_route, "reasoning": f"Local intent router (confidence {confidence:.2f})"}
+        else:
+            return Command(goto="END",
+                           update={"messages": messages + [AIMessage(content=f"Supervisor failed to route: {e}")]})
 
-    goto = result["next"]
-    reasoning = result["reasoning"]
+    if local_route:
+        goto = local_route
+        reasoning = f"Local intent router (confidence {confidence:.2f})"
+    else:
+        goto = result["next"]
+        reasoning = result["reasoning"]
+        record_llm_route(guess, confidence, goto)
+    booking_params = merge_extracted_params(booking_params, result)
 
     log = {
         "supervisor": {
@@ -260,21 +321,30 @@ The user's last message: {state["user_query"]}
     }
     messages.append(AIMessage(content=json.dumps(log)))
 
-    return Command(goto=goto, update={"messages": messages})
+    return Command(goto=goto, update={"messages": messages, "booking_params": booking_params})
 
 
-def Iterationagent(state: State) -> Command[Literal["Supervisor"]]:
+async def Iterationagent(state: State) -> Command[Literal["Supervisor"]]:
     # ... (Iterationagent logic remains the same)
 
     messages = state["messages"]
     user_query = state["user_query"]
     print("Iteration Agent: Generating structured plans...")
 
+    # Progress events for /api/chat/stream; a no-op under plain ainvoke().
+    writer = get_stream_writer()
+
+    def emit(event, data):
+        # Snapshot: later stages keep mutating these dicts in place.
+        try:
+            writer({"event": event, "data": copy.deepcopy(data)})
+        except Exception as e:  # the shared itinerary run outlives a disconnected stream
+            print(f"⚠️ Progress event '{event}' dropped: {e}")
+
 
     try:
         import json
         from colorama import Fore, Style
-        import asyncio
         from datetime import datetime
         import json
 
@@ -297,54 +367,90 @@ def Iterationagent(state: State) -> Command[Literal["Supervisor"]]:
         # STEP 1: Understanding User Intent
         print(f"{Fore.CYAN}{'-' * 50}\n🎯 STEP 1: Understanding User Intent\n{'-' * 50}{Style.RESET_ALL}")
         start_step1 = datetime.now()
-        trip1 = get_structured_trip_details(prompt_1)
+        # Identical queries already being parsed share one LLM call (singleflight.py).
+        trip1, _ = await intent_flight.ado(normalize_query(prompt_1), lambda: aget_structured_trip_details(prompt_1))
 
         end_step1 = datetime.now()
         print("\nStructured Intent Response:\n")
         print(trip1.model_dump_json(indent=2))
+        emit("trip_details", trip1.model_dump())
         step1_time = log_time("STEP 1 (Understanding User Intent)", start_step1, end_step1)
         # log_process("STEP 1 - Understanding User Intent", step1_time)
 
-        # STEP 2: Destination + Spots + Hotels
-        print(
-            f"\n{Fore.CYAN}{'-' * 50}\n📍 STEP 2: Destination + Spots Search + Hotel Search\n{'-' * 50}{Style.RESET_ALL}")
-        start_step2 = datetime.now()
-        # step2 = run_step2(trip1.model_dump())
-        step2 = asyncio.run(run_step2(trip1.model_dump()))
-        end_step2 = datetime.now()
-        print(json.dumps(step2, indent=2))
-        step2_time = log_time("STEP 2 (Destination + Spots + Hotels)", start_step2, end_step2)
-        # log_process("STEP 2 - Destination + Spots Search + Hotel Search", step1_time)
-
-        # STEP 3: Distance + Cost Estimation
-        print(f"\n{Fore.GREEN}{'-' * 50}\n🛣️ STEP 3: Distance + Cost Estimation\n{'-' * 50}{Style.RESET_ALL}")
-        start_step3 = datetime.now()
-        step3 = asyncio.run(process_spots(step2))
-        end_step3 = datetime.now()
-        print(json.dumps(step3, indent=2))
-        step3_time = log_time("STEP 3 (Distance + Cost Estimation)", start_step3, end_step3)
-
-        # STEP 3: Bridge Conversion + LLM Formatting
-        print(f"\n{Fore.YELLOW}{'-' * 50}\n🧩 Bridge: Step 3 → Step 4 Conversion\n{'-' * 50}{Style.RESET_ALL}")
-        start_step4 = datetime.now()
-        python_output = optimize_day_plan(step2, step3)
-        final_itinerary = format_itinerary_with_llm(python_output, prompt_1)
-        end_step4 = datetime.now()
-        print("\nLLM Formatted Itinerary:\n")
-        print(json.dumps(final_itinerary, indent=2))
-        step4_time = log_time("STEP 3 to 4 (Itinerary Optimization + LLM Formatting)", start_step4, end_step4)
-
-        # STEP 5–6: Weather + Enhancements + Final Itinerary
-        print(
-            f"\n{Fore.MAGENTA}{'=' * 50}\n🌦️ STEP 4 & 5 & STEP 6: Weather ✓ Final Itinerary ✓ Enhancements ✓\n{'=' * 50}{Style.RESET_ALL}"
-        )
-        start_step5 = datetime.now()
-        result = asyncio.run(run_itinerary_pipeline(final_itinerary))
+        # STEPS 2–6 run once per (query, trip details) at a time; concurrent
+        # duplicates wait for that run and replay its progress events.
+        async def plan_trip():
+            # STEP 2: Destination + Spots + Hotels
+            print(
+                f"\n{Fore.CYAN}{'-' * 50}\n📍 STEP 2: Destination + Spots Search + Hotel Search\n{'-' * 50}{Style.RESET_ALL}")
+            start_step2 = datetime.now()
+            # step2 = run_step2(trip1.model_dump())
+            step2 = await run_step2(trip1.model_dump())
+            end_step2 = datetime.now()
+            print(json.dumps(step2, indent=2))
+            emit("spots", step2)
+            step2_time = log_time("STEP 2 (Destination + Spots + Hotels)", start_step2, end_step2)
+            # log_process("STEP 2 - Destination + Spots Search + Hotel Search", step1_time)
+
+            # STEP 3: Distance + Cost Estimation
+            print(f"\n{Fore.GREEN}{'-' * 50}\n🛣️ STEP 3: Distance + Cost Estimation\n{'-' * 50}{Style.RESET_ALL}")
+            start_step3 = datetime.now()
+            step3 = await process_spots(step2)
+            end_step3 = datetime.now()
+            print(json.dumps({k: v for k, v in step3.items() if k != "travel_time_matrix_min"}, indent=2))
+            step3_time = log_time("STEP 3 (Distance + Cost Estimation)", start_step3, end_step3)
+
+            # STEP 3: Bridge Conversion + LLM Formatting, overlapped with STEPS 5–6:
+            # each plan is enriched as soon as it has been generated.
+            print(f"\n{Fore.YELLOW}{'-' * 50}\n🧩 Bridge: Step 3 → Step 4 Conversion\n{'-' * 50}{Style.RESET_ALL}")
+            start_step4 = datetime.now()
+            python_output = await asyncio.to_thread(optimize_day_plan, step2, step3)  # CPU-bound
+            emit("day_plan", python_output)
+            plan_times = []
+
+            def on_plan(i, plan):
+                plan_times.append(datetime.now())
+                emit("plan", {"index": i, "plan": plan})
+
+            # STEP 5–6: Weather + Enhancements + Final Itinerary
+            print(
+                f"\n{Fore.MAGENTA}{'=' * 50}\n🌦️ STEP 4 & 5 & STEP 6: Weather ✓ Final Itinerary ✓ Enhancements ✓\n{'=' * 50}{Style.RESET_ALL}"
+            )
+            final_itinerary, result = await plan_and_enrich(
+                python_output,
+                prompt_1,
+                on_plan=on_plan,
+                on_trip=lambda i, trip: emit("enriched", {"index": i, "plan": trip}),
+            )
+            end_step5 = datetime.now()
+            end_step4 = plan_times[-1] if plan_times else end_step5
+            print("\nLLM Formatted Itinerary:\n")
+            print(json.dumps(final_itinerary, indent=2))
+            step4_time = log_time("STEP 3 to 4 (Itinerary Optimization + LLM Formatting)", start_step4, end_step4)
+
+            print("\n📌 FINAL RESULT:\n")
+            print(json.dumps(result, indent=2))
+            step5_time = log_time("STEP 5–6 (Weather + Final Enhancements, after the last plan)", end_step4, end_step5)
+
+            return {
+                "step2": step2,
+                "day_plan": python_output,
+                "plans": final_itinerary,
+                "result": result,
+                "timings": (step2_time, step3_time, step4_time, step5_time),
+            }
 
-        end_step5 = datetime.now()
-        print("\n📌 FINAL RESULT:\n")
-        print(json.dumps(result, indent=2))
-        step5_time = log_time("STEP 5–6 (Weather + Final Enhancements)", start_step5, end_step5)
+        bundle, shared = await itinerary_flight.ado(f"{normalize_query(prompt_1)}|{trip1.model_dump_json()}", plan_trip)
+        if shared:
+            emit("spots", bundle["step2"])
+            emit("day_plan", bundle["day_plan"])
+            for i, plan in enumerate(bundle["plans"]):
+                emit("plan", {"index": i, "plan": plan})
+            results = bundle["result"] if isinstance(bundle["result"], list) else [bundle["result"]]
+            for i, trip in enumerate(results):
+                emit("enriched", {"index": i, "plan": trip})
+        result = bundle["result"]
+        step2_time, step3_time, step4_time, step5_time = bundle["timings"]
 
         # END — Calculate total duration
         overall_end = datetime.now()
@@ -392,45 +498,19 @@ def Iterationagent(state: State) -> Command[Literal["Supervisor"]]:
         return Command(goto="END", update={"messages": messages, "execution_status": "Plan generation failed."})
 
 
-class CityExtractionSchema(BaseModel):
-    """Structured data for extracting origin and destination cities."""
-    origin_city: str = Field(description="The starting city for the bus trip.")
-    destination_city: str = Field(description="The destination city for the bus trip.")
-def BusBookingAgent(state:State)->Command[Literal["END"]]:
+async def BusBookingAgent(state:State)->Command[Literal["END"]]:
 
     """
     Handles bus route search using Google Directions API.
-    It first uses an LLM call to reliably extract the origin and destination cities
-    from the user query, and then uses the extracted data for the search.
+    The origin and destination cities come from booking_params, which the
+    Supervisor's routing call fills in, so this agent makes no LLM call.
     """
     messages = state["messages"]
-    user_query = state["user_query"]  # Get the original user query
-
-    print("Bus Booking Agent: Starting LLM extraction for source and destination...")
-
-    # --- 1. LLM CALL TO EXTRACT CITIES ---
-    extraction_prompt = f"""
-    Analyze the following user query which is intended for a bus booking.
-    Strictly extract and return ONLY the starting city (origin) and the ending city (destination).
-    Query: "{user_query}"
-    """
-
-    try:
-        # Use the global LLM initialized with the structured output schema
-        llm_extractor = llm.with_structured_output(CityExtractionSchema)
-        extraction_result = llm_extractor.invoke(extraction_prompt)
-
-        origin_city = extraction_result.origin_city
-        destination_city = extraction_result.destination_city
-
-        print(f"LLM Extraction successful: Origin='{origin_city}', Destination='{destination_city}'")
+    params = state.get("booking_params", {})
 
-    except Exception as e:
-        # Fallback to the existing simple params if the LLM extraction fails
-        print(f"LLM Extraction failed: {e}. Falling back to booking_params.")
-        params = state.get("booking_params", {})
-        origin_city = params.get('origin')
-        destination_city = params.get('destination')
+    # --- 1. EXTRACTED CITIES ---
+    origin_city = params.get('origin')
+    destination_city = params.get('destination')
 
     # --- 2. VALIDATION AND ERROR CHECK ---
 
@@ -449,8 +529,7 @@ def BusBookingAgent(state:State)->Command[Literal["END"]]:
     # --- 3. GOOGLE DIRECTIONS API CALL ---
     try:
         # Utilize the helper function provided in the prompt
-        # We pass the LLM-extracted (and potentially more accurate) city names
-        bus_data = get_bus_routes_json(origin_city, destination_city)
+        bus_data = await asyncio.to_thread(get_bus_routes_json, origin_city, destination_city)
         print("indide lang3",bus_data)
 
         if "error" in bus_data:
@@ -497,33 +576,23 @@ def BusBookingAgent(state:State)->Command[Literal["END"]]:
 
 
 
-def AccomodationAgent(state:State)-> Command[Literal["END"]]:
+async def AccomodationAgent(state:State)-> Command[Literal["END"]]:
     user_query=state["user_query"]
     messages=state["messages"]
     """
        Specialized agent to find and recommend the best accommodation options.
 
        Flow:
-       1. Extract address from user query using an LLM.
+       1. Take the address the Supervisor extracted into booking_params.
        2. Call the external utility to find hotels.
        3. Update the state object with the structured results.
        4. Return control flow command "END".
        """
     print("\n--- AccommodationAgent STARTED ---")
     user_query = state.get("user_query", "No query provided.")
-    extraction_prompt = f"""
-        Analyze the following user query which is intended for accommodation booking.
-    Strictly extract and return ONLY the primary location or full address for the search.
-    If multiple locations are mentioned, return the most prominent one.
-    Query: {user_query}
-       """
-    try:
-        response = llm.invoke([SystemMessage(content=extraction_prompt), HumanMessage(content=user_query)])
-        acoomdationdetails = response.content
-    except Exception as e:
-        print(f"General Chat LLM Error: {e}")
-        chat_response = "I'm sorry, I'm having trouble with my chat services right now."
-    result=find_best_nearby_hotels(acoomdationdetails)
+    params = state.get("booking_params", {})
+    acoomdationdetails = params.get("address") or params.get("destination") or user_query
+    result = await asyncio.to_thread(find_best_nearby_hotels, acoomdationdetails)
     print(f"result from accomodation agent{result}")
     log = {
         "BusBookingAgent": {
@@ -538,7 +607,7 @@ def AccomodationAgent(state:State)-> Command[Literal["END"]]:
 
 
 
-def FlightBookingagent(state: State) -> Command[Literal["END"]]:
+async def FlightBookingagent(state: State) -> Command[Literal["END"]]:
     """Handles flight search using Amadeus API and structures the output."""
     messages = state["messages"]
     params = state.get("booking_params", {})
@@ -560,12 +629,14 @@ def FlightBookingagent(state: State) -> Command[Literal["END"]]:
 
     try:
         # 1. Get Token
-        token = get_amadeus_token('7ft36WGf3banF9BF1MvojU1NdEirPB6e','jdKIeW9Mt0KXOCTr' )
+        token = await asyncio.to_thread(get_amadeus_token, '7ft36WGf3banF9BF1MvojU1NdEirPB6e','jdKIeW9Mt0KXOCTr' )
         if not token: raise Exception("Failed to get Amadeus access token.")
 
-        # 2. Get IATA codes
-        origin_iata = get_iata_code_for_city(token, origin_city)
-        destination_iata = get_iata_code_for_city(token, destination_city)
+        # 2. Get IATA codes (both lookups at once)
+        origin_iata, destination_iata = await asyncio.gather(
+            asyncio.to_thread(get_iata_code_for_city, token, origin_city),
+            asyncio.to_thread(get_iata_code_for_city, token, destination_city),
+        )
         if not (origin_iata and destination_iata): raise Exception("Failed to find IATA codes for the cities.")
 
         # 3. Search for Flights
@@ -579,7 +650,9 @@ def FlightBookingagent(state: State) -> Command[Literal["END"]]:
         }
 
         flight_headers = {'Authorization': f'Bearer {token}'}
-        flight_response = requests.get(FLIGHT_SEARCH_URL, headers=flight_headers, params=flight_params)
+        flight_response = await asyncio.to_thread(
+            request_with_retry, "GET", FLIGHT_SEARCH_URL, upstream="amadeus", headers=flight_headers, params=flight_params
+        )
         flight_response.raise_for_status()
         flight_data = flight_response.json().get('data', [])
 
@@ -648,7 +721,7 @@ def FlightBookingagent(state: State) -> Command[Literal["END"]]:
 
 
 
-def GeneralChatagent(state: State) -> Command[Literal["END"]]:
+async def GeneralChatagent(state: State) -> Command[Literal["END"]]:
     # ... (GeneralChatagent logic remains the same)
 
     user_query = state["user_query"]
@@ -658,7 +731,7 @@ def GeneralChatagent(state: State) -> Command[Literal["END"]]:
     system_instruction = "You are a friendly and helpful travel AI. Respond concisely to the user's message. Do not generate itineraries or discuss bookings unless prompted. Keep the response short and conversational."
 
     try:
-        response = llm.invoke([SystemMessage(content=system_instruction), HumanMessage(content=user_query)])
+        response = await llm.ainvoke([SystemMessage(content=system_instruction), HumanMessage(content=user_query)])
         chat_response = response.content
     except Exception as e:
         print(f"General Chat LLM Error: {e}")
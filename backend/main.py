@@ -4,10 +4,10 @@ from planner import  process_spots
 from planner import  optimize_day_plan
 from planner import  format_itinerary_with_llm
 from planner import  run_itinerary_pipeline
+from event_loop import run_sync
 if __name__ == "__main__":
     import json
     from colorama import Fore, Style
-    import asyncio
     from datetime import datetime
     import json
 
@@ -45,7 +45,7 @@ if __name__ == "__main__":
     print(f"\n{Fore.CYAN}{'-' * 50}\n📍 STEP 2: Destination + Spots Search + Hotel Search\n{'-' * 50}{Style.RESET_ALL}")
     start_step2 = datetime.now()
     # step2 = run_step2(trip1.model_dump())
-    step2 = asyncio.run(run_step2(trip1.model_dump()))
+    step2 = run_sync(run_step2(trip1.model_dump()))
     end_step2 = datetime.now()
     print(json.dumps(step2, indent=2))
     step2_time = log_time("STEP 2 (Destination + Spots + Hotels)", start_step2, end_step2)
@@ -54,9 +54,9 @@ if __name__ == "__main__":
     # STEP 3: Distance + Cost Estimation
     print(f"\n{Fore.GREEN}{'-' * 50}\n🛣️ STEP 3: Distance + Cost Estimation\n{'-' * 50}{Style.RESET_ALL}")
     start_step3 = datetime.now()
-    step3 = asyncio.run(process_spots(step2))
+    step3 = run_sync(process_spots(step2))
     end_step3 = datetime.now()
-    print(json.dumps(step3, indent=2))
+    print(json.dumps({k: v for k, v in step3.items() if k != "travel_time_matrix_min"}, indent=2))
     step3_time = log_time("STEP 3 (Distance + Cost Estimation)", start_step3, end_step3)
 
     # STEP 3: Bridge Conversion + LLM Formatting
@@ -74,7 +74,7 @@ if __name__ == "__main__":
         f"\n{Fore.MAGENTA}{'=' * 50}\n🌦️ STEP 4 & 5 & STEP 6: Weather ✓ Final Itinerary ✓ Enhancements ✓\n{'=' * 50}{Style.RESET_ALL}"
     )
     start_step5 = datetime.now()
-    result = asyncio.run(run_itinerary_pipeline(final_itinerary))
+    result = run_sync(run_itinerary_pipeline(final_itinerary))
 
     end_step5 = datetime.now()
     print("\n📌 FINAL RESULT:\n")
@@ -99,4 +99,4 @@ if __name__ == "__main__":
     print(f"  Step 4-5–6: {step5_time:.2f}s")
     print(f"{'-' * 50}")
     print(f"  🕒 Total Time: {overall_duration:.2f}s")
-    print(f"{'=' * 50}{Style.RESET_ALL}")
\ No newline at end of file
+    print(f"{'=' * 50}{Style.RESET_ALL}")
\ No newline at end of file
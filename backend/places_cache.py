@@ -0,0 +1,33 @@
+import os
+import re
+
+from sqlite_cache import SqliteTTLCache
+
+# -------------------------
+# CONFIG
+# -------------------------
+PLACES_SEARCH_TTL_SEC = int(os.getenv("PLACES_SEARCH_TTL_SEC", str(6 * 3600)))
+PLACES_DETAILS_TTL_SEC = int(os.getenv("PLACES_DETAILS_TTL_SEC", str(24 * 3600)))
+PLACES_CACHE_MAX_ENTRIES = int(os.getenv("PLACES_CACHE_MAX_ENTRIES", "20000"))
+
+# Only cache answers that are actually answers; errors and quota failures must be retried.
+CACHEABLE_STATUSES = {"OK", "ZERO_RESULTS"}
+
+text_search_cache = SqliteTTLCache("places_text_search", PLACES_SEARCH_TTL_SEC, PLACES_CACHE_MAX_ENTRIES)
+details_cache = SqliteTTLCache("places_details", PLACES_DETAILS_TTL_SEC, PLACES_CACHE_MAX_ENTRIES)
+
+
+def _normalize(text) -> str:
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower()
+
+
+def text_search_key(query: str, location: str) -> str:
+    """'Beaches  tourist places' in 'Goa' and 'beaches tourist places' in 'goa ' share a key."""
+    return f"{_normalize(query)}|{_normalize(location)}"
+
+
+def get_places_cache_stats() -> dict:
+    return {
+        "text_search": text_search_cache.stats(),
+        "details": details_cache.stats(),
+    }
@@ -0,0 +1,51 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+# Response schema for itinerary generation (planner.py and re_planner.py).
+# Gemini's schemas have no map type, so days come back as a list and
+# plan_from_schema() turns them into the {"Day 1": [...]} shape the rest of
+# the pipeline and the frontend use.
+class PlanHotel(BaseModel):
+    name: str
+    lat: float
+    lng: float
+    rating: Optional[float] = None
+    types: List[str] = []
+    open_now: Optional[bool] = None
+
+
+class PlanActivity(BaseModel):
+    spot_name: str
+    lat: float
+    long: float
+    description: str
+    estimated_time_spent: str
+
+
+class PlanDay(BaseModel):
+    day: str  # "Day 1", "Day 2", ...
+    activities: List[PlanActivity]
+
+
+class ItineraryPlan(BaseModel):
+    date: str
+    duration_days: int
+    itinerary_name: str
+    hotel: PlanHotel
+    itinerary: List[PlanDay]
+
+
+PLANS_SCHEMA = list[ItineraryPlan]
+
+
+def plan_from_schema(plan):
+    """Schema-shaped plan -> pipeline shape; anything else is returned unchanged."""
+    if not isinstance(plan, dict) or not isinstance(plan.get("itinerary"), list):
+        return plan
+    days = {}
+    for i, day in enumerate(plan["itinerary"], start=1):
+        if isinstance(day, dict):
+            days[day.get("day") or f"Day {i}"] = day.get("activities") or []
+    return {**plan, "itinerary": days}
@@ -3,17 +3,26 @@ from typing import List, Optional, Dict
 import random
 from google import genai
 from google.genai import types
-import aiohttp
-from aiohttp import ClientTimeout
-from google.oauth2 import service_account
 import json
 import time
 import math
 import asyncio
-import httpx
+import numpy as np
 from typing import Dict, List, Tuple
 import os
 from dotenv import load_dotenv
+from http_client import get_session
+from vertex_client import get_async_models
+from event_loop import run_sync
+from json_stream import JsonArrayStream
+from json_repair import count_repair, loads_tolerant
+from plan_schema import PLANS_SCHEMA, plan_from_schema
+from shared_fetch import SharedFetch
+from retry import get_json_with_retry
+from weather_cache import cached_weather
+from intent_cache import cached_trip_details, trip_intent_cache
+from places_cache import CACHEABLE_STATUSES, details_cache, text_search_cache, text_search_key
+from distance_matrix import build_distance_matrix_async, build_travel_matrix, point_key
 load_dotenv()
 
 # -------------------------
@@ -22,6 +31,11 @@ load_dotenv()
 PER_KM_COST = 15  # ₹ per km (shared cab)
 MAX_TRAVEL_DISTANCE_PER_SPOT = 150  # km from hotel
 MAX_DAILY_TRAVEL_MIN = 480  # 8 hours/day
+OPTIMIZER_TIME_BUDGET_SEC = float(os.getenv("OPTIMIZER_TIME_BUDGET_SEC", "0.5"))  # 2-opt / Or-opt budget
+UNKNOWN_TRAVEL_MIN = 999999  # selection cost of a pair the Distance Matrix had no answer for
+PLAN_COUNT = 3  # itineraries per request (the single-call prompt asks for three)
+PLAN_GENERATION_MODE = os.getenv("PLAN_GENERATION_MODE", "single")  # "single", "stream" or "fanout" (see aiter_itinerary_plans)
+PLAN_MAX_OUTPUT_TOKENS = 24000  # for all PLAN_COUNT plans; fan-out calls get an equal share
 
 
 GOOGLE_MAPS_API_KEY = "GOOGLE_MAPS_API_KEY"
@@ -35,6 +49,8 @@ SCOPES = os.getenv("SCOPES").split(",") if os.getenv("SCOPES") else []
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com")
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org")
 
 # MODEL_ID = "gemini-2.5-pro"
 # MODEL_ID= "gemini-2.5-flash"
@@ -42,16 +58,6 @@ MODEL_ID = "gemini-2.5-flash-lite"
 
 
 
-_credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_PATH, scopes=SCOPES
-)
-
-_client = genai.Client(
-    vertexai=True,
-    project=VERTEX_PROJECT,
-    location=VERTEX_LOCATION,
-    credentials=_credentials
-)
 
 
 
@@ -77,22 +83,20 @@ class TripDetails(BaseModel):
 
 # --- Vertex AI Structured Extraction ---
 def get_structured_trip_details(user_prompt: str) -> Optional[TripDetails]:
+    """Structured trip intent, from the intent cache when a same-meaning prompt was seen recently."""
+    return run_sync(aget_structured_trip_details(user_prompt))
+
+
+async def aget_structured_trip_details(user_prompt: str) -> Optional[TripDetails]:
+    return await cached_trip_details(trip_intent_cache, user_prompt, _extract_trip_details, TripDetails)
+
+
+async def _extract_trip_details(user_prompt: str) -> Optional[TripDetails]:
     if not os.path.exists(SERVICE_ACCOUNT_PATH):
         print(f"Error: Service account not found: {SERVICE_ACCOUNT_PATH}")
         return None
 
     try:
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_PATH, scopes=SCOPES
-        )
-
-        client = genai.Client(
-            vertexai=True,
-            project=VERTEX_PROJECT,
-            location=VERTEX_LOCATION,
-            credentials=credentials
-        )
-
         system_instruction = (
             "You are an expert travel planner assistant. Convert the user's text into structured JSON only. "
             "Follow these rules:\n"
@@ -135,7 +139,7 @@ def get_structured_trip_details(user_prompt: str) -> Optional[TripDetails]:
             "}"
         )
 
-        response = client.models.generate_content(
+        response = await get_async_models().generate_content(
             model=MODEL_ID,
             contents=user_prompt,
             config=types.GenerateContentConfig(
@@ -158,25 +162,43 @@ def get_structured_trip_details(user_prompt: str) -> Optional[TripDetails]:
 
 MIN_RATING = 3.5
 
-async def fetch_json(session, url, params):
-    async with session.get(url, params=params) as response:
-        return await response.json()
+async def fetch_json(session, url, params, upstream="places", hedge=None):
+    try:
+        return await get_json_with_retry(session, url, params, upstream=upstream, hedge=hedge)
+    except Exception as e:
+        print(f"⚠️ {upstream} request failed: {e}")
+        return {}
 
 async def places_text_search(session, query, location):
-    url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+    cache_key = text_search_key(query, location)
+    cached = await text_search_cache.aget(cache_key)
+    if cached is not None:
+        return cached
+
+    url = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/textsearch/json"
     params = {"query": f"{query} in {location}", "key": GOOGLE_API_KEY}
     data = await fetch_json(session, url, params)
-    return data.get("results", [])
+    results = data.get("results", [])
+    if data.get("status") in CACHEABLE_STATUSES:
+        await text_search_cache.aset(cache_key, results)
+    return results
 
 async def place_details(session, place_id):
-    url = "https://maps.googleapis.com/maps/api/place/details/json"
+    cached = await details_cache.aget(place_id)
+    if cached is not None:
+        return cached
+
+    url = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/details/json"
     params = {
         "place_id": place_id,
         "fields": "place_id,name,geometry,rating,opening_hours,types",
         "key": GOOGLE_API_KEY,
     }
-    data = await fetch_json(session, url, params)
-    return data.get("result")
+    data = await fetch_json(session, url, params, hedge="place_details")
+    result = data.get("result")
+    if result and data.get("status") in CACHEABLE_STATUSES:
+        await details_cache.aset(place_id, result)
+    return result
 
 def fetch_spot_data(place):
     return {
@@ -209,18 +231,19 @@ async def run_step2(input_data):
                      ]
 
     all_spots = []
-    async with aiohttp.ClientSession() as session:
-        # Step 1: Run all text searches concurrently
-        search_tasks = [places_text_search(session, q, destination) for q in search_queries]
-        search_results = await asyncio.gather(*search_tasks)
-        search_results = [r for results in search_results for r in results]
-
-        # Step 2: Filter & fetch details concurrently
-        detail_tasks = [
-            place_details(session, r["place_id"])
-            for r in search_results if r.get("rating", 0) >= MIN_RATING
-        ]
-        details_list = await asyncio.gather(*detail_tasks)
+    session = get_session()
+
+    # Step 1: Run all text searches concurrently
+    search_tasks = [places_text_search(session, q, destination) for q in search_queries]
+    search_results = await asyncio.gather(*search_tasks)
+    search_results = [r for results in search_results for r in results]
+
+    # Step 2: Filter & fetch details concurrently
+    detail_tasks = [
+        place_details(session, r["place_id"])
+        for r in search_results if r.get("rating", 0) >= MIN_RATING
+    ]
+    details_list = await asyncio.gather(*detail_tasks)
 
     for d in details_list:
         if d and d.get("geometry", {}).get("location"):
@@ -239,26 +262,6 @@ async def run_step2(input_data):
 # -------------------------
 # HELPER FUNCTIONS
 # -------------------------
-async def build_distance_matrix_async(
-    origins: List[Tuple[float, float]], destinations: List[Tuple[float, float]]
-) -> Dict:
-    """Asynchronous Google Distance Matrix API call."""
-    url = "https://maps.googleapis.com/maps/api/distancematrix/json"
-    origin_str = "|".join([f"{lat},{lng}" for lat, lng in origins])
-    dest_str = "|".join([f"{lat},{lng}" for lat, lng in destinations])
-    params = {
-        "origins": origin_str,
-        "destinations": dest_str,
-        "key": GOOGLE_MAPS_API_KEY,
-        "units": "metric",
-    }
-
-    async with httpx.AsyncClient(timeout=20) as client:
-        response = await client.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
-
-
 def estimate_travel_cost(distance_km: float) -> int:
     """Estimate travel cost (₹) based on distance."""
     return int(distance_km * PER_KM_COST)
@@ -274,31 +277,59 @@ async def process_spots(step2_data: Dict) -> Dict:
     hotel = step2_data["hotel_location"]
     spots = step2_data["spots"]
 
-    origins = [(hotel["lat"], hotel["lng"])]
-    destinations = [(s["lat"], s["lng"]) for s in spots]
-
     # -------------------------
-    # STEP 3.1 — HOTEL ➜ SPOTS
+    # STEP 3.0 — GREAT-CIRCLE PRE-FILTER
     # -------------------------
-    print("\n🚀 STEP 3.1: Calling Distance Matrix API for Hotel ➜ Spots...")
-    start_hotel_to_spots = time.time()
-
-    dm_response = await build_distance_matrix_async(origins, destinations)
-
-
+    # Driving distance is never shorter than the great-circle distance, so spots
+    # beyond the limit as the crow flies can be dropped before paying for them.
+    if spots and hotel.get("lat") is not None:
+        gc_km = haversine_km_array(
+            hotel["lat"], hotel["lng"],
+            np.array([s["lat"] for s in spots], dtype=float),
+            np.array([s["lng"] for s in spots], dtype=float),
+        )
+        keep = gc_km <= MAX_TRAVEL_DISTANCE_PER_SPOT
+        if not keep.all():
+            print(f"✂️ Pre-filter dropped {int((~keep).sum())} of {len(spots)} spots beyond {MAX_TRAVEL_DISTANCE_PER_SPOT} km")
+            spots = [s for s, k in zip(spots, keep) if k]
 
-    hotel_to_spots_time = round(time.time() - start_hotel_to_spots, 2)
+    # -------------------------
+    # STEP 3.1 — ONE TILED MATRIX FOR HOTEL + SPOTS
+    # -------------------------
+    # The hotel is picked from the spots, so its row of the spot matrix is the
+    # hotel ➜ spots row. Only a hotel outside the list costs an extra row.
+    points = [(s["lat"], s["lng"]) for s in spots]
+    keys = [point_key(s["lat"], s["lng"], s.get("id")) for s in spots]
+    n = len(spots)
+    hotel_idx = find_hotel_index(hotel, spots)
+
+    need = ~np.eye(n, dtype=bool)
+    if hotel_idx is None and hotel.get("lat") is not None:
+        points.append((hotel["lat"], hotel["lng"]))
+        keys.append(point_key(hotel["lat"], hotel["lng"], hotel.get("id")))
+        hotel_idx = n
+        need = np.pad(need, ((0, 1), (0, 1)))
+        need[hotel_idx, :n] = True
+
+    print("\n🚀 STEP 3.1: Calling Distance Matrix API for Hotel + Spots (tiled, cached pairs skipped)...")
+    start_matrix = time.time()
+    distance_m, duration_s = await build_travel_matrix(points, need, keys=keys)
+    matrix_time = round(time.time() - start_matrix, 2)
+    print(f"✅ Distance Matrix completed in {matrix_time}s")
 
+    # -------------------------
+    # STEP 3.2 — HOTEL ➜ SPOTS FEATURES
+    # -------------------------
+    start_hotel_to_spots = time.time()
     results = []
     budget_used = 0
 
-    for i, row in enumerate(dm_response["rows"][0]["elements"]):
-        spot = spots[i]
-        if row["status"] != "OK":
+    for i, spot in enumerate(spots):
+        if np.isnan(distance_m[hotel_idx, i]):
             continue
 
-        dist_km = round(row["distance"]["value"] / 1000, 2)
-        time_min = round(row["duration"]["value"] / 60, 1)
+        dist_km = round(float(distance_m[hotel_idx, i]) / 1000, 2)
+        time_min = round(float(duration_s[hotel_idx, i]) / 60, 1)
 
         if dist_km > MAX_TRAVEL_DISTANCE_PER_SPOT:
             continue
@@ -313,48 +344,31 @@ async def process_spots(step2_data: Dict) -> Dict:
             "travel_cost": travel_cost,
             "entry_fee": spot.get("entry_fee", 0),
             "lat": spot["lat"],
-            "lng": spot["lng"]
+            "lng": spot["lng"],
+            "matrix_index": i,  # row/column in travel_time_matrix_min
         })
 
-    print(f"✅ Hotel ➜ Spots completed in {hotel_to_spots_time}s")
+    hotel_to_spots_time = round(time.time() - start_hotel_to_spots, 2)
 
     # -------------------------
-    # STEP 3.2 — SPOT ➜ SPOT (PARALLEL)
+    # STEP 3.3 — SPOT ➜ SPOT LOOKUP
     # -------------------------
-    print("\n🌍 STEP 3.2: Calling Distance Matrix API for Spot ➜ Spot (parallel)...")
     start_spot_to_spot = time.time()
-
-    async def spot_to_spot_matrix(s1):
-        o = [(s1["lat"], s1["lng"])]
-        d = [(s2["lat"], s2["lng"]) for s2 in spots if s2["name"] != s1["name"]]
-        try:
-            dm_pair = await build_distance_matrix_async(o, d)
-            matrix = {}
-            j = 0
-            for s2 in spots:
-                if s2["name"] == s1["name"]:
-                    continue
-                el = dm_pair["rows"][0]["elements"][j]
-                j += 1
-                if el["status"] != "OK":
-                    continue
-                matrix[s2["name"]] = {
-                    "distance_km": round(el["distance"]["value"] / 1000, 1),
-                    "time_min": round(el["duration"]["value"] / 60, 1)
-                }
-            return s1["name"], matrix
-        except Exception as e:
-            print(f"❌ Error for {s1['name']}: {e}")
-            return s1["name"], {}
-
-    pair_tasks = [spot_to_spot_matrix(s) for s in spots]
-    pair_results = await asyncio.gather(*pair_tasks)
-    pair_matrix = dict(pair_results)
+    pair_matrix = {}
+    for i, s1 in enumerate(spots):
+        matrix = {}
+        for j, s2 in enumerate(spots):
+            if s2["name"] == s1["name"] or np.isnan(distance_m[i, j]):
+                continue
+            matrix[s2["name"]] = {
+                "distance_km": round(float(distance_m[i, j]) / 1000, 1),
+                "time_min": round(float(duration_s[i, j]) / 60, 1)
+            }
+        pair_matrix[s1["name"]] = matrix
 
     spot_to_spot_time = round(time.time() - start_spot_to_spot, 2)
     total_time = round(time.time() - start_total, 2)
 
-    print(f"✅ Spot ➜ Spot completed in {spot_to_spot_time}s")
     print(f"\n⏱️ TOTAL Step 3 processing time: {total_time}s")
 
     # -------------------------
@@ -363,11 +377,14 @@ async def process_spots(step2_data: Dict) -> Dict:
     return {
         "spots_distance_features": results,
         "distance_matrix": pair_matrix,
+        # Same minutes as distance_matrix, as an array for optimize_day_plan (NaN = unknown).
+        "travel_time_matrix_min": np.round(duration_s[:n, :n] / 60, 1),
         "budget_used_so_far": budget_used,
         "travel_constraints": {
             "max_daily_travel_min": MAX_DAILY_TRAVEL_MIN
         },
         "time_taken": {
+            "distance_matrix_sec": matrix_time,
             "hotel_to_spots_sec": hotel_to_spots_time,
             "spot_to_spot_sec": spot_to_spot_time,
             "total_step3_sec": total_time
@@ -375,12 +392,27 @@ async def process_spots(step2_data: Dict) -> Dict:
     }
 
 
+def find_hotel_index(hotel: Dict, spots: List[Dict]) -> Optional[int]:
+    """Index of the hotel within `spots` (same place id or coordinates), else None."""
+    for i, s in enumerate(spots):
+        if hotel.get("id") and s.get("id") == hotel.get("id"):
+            return i
+        if (s["lat"], s["lng"]) == (hotel.get("lat"), hotel.get("lng")):
+            return i
+    return None
+
+
 # ===========================
 # 🧩 Helper — JSON Auto Fixer
 # ===========================
 def fix_broken_json(bad_json: str) -> dict:
-    """Repair malformed or truncated JSON using Gemini safely."""
+    return run_sync(afix_broken_json(bad_json))
+
+
+async def afix_broken_json(bad_json: str) -> dict:
+    """Repair malformed or truncated JSON using Gemini (last resort, after json_repair.loads_tolerant)."""
     print("⚙️ Attempting to auto-fix malformed JSON...")
+    count_repair("llm_repairs")
     repair_prompt = f"""
     The following JSON is invalid or incomplete.
     Your job is to **only repair** structural issues (missing commas, brackets, quotes)
@@ -397,7 +429,7 @@ def fix_broken_json(bad_json: str) -> dict:
         response_mime_type="application/json",
         temperature=0.0,
     )
-    repair_response = _client.models.generate_content(
+    repair_response = await get_async_models().generate_content(
         model=MODEL_ID,
         contents=repair_prompt,
         config=repair_config,
@@ -407,6 +439,7 @@ def fix_broken_json(bad_json: str) -> dict:
     try:
         return json.loads(fixed_text)
     except Exception:
+        count_repair("llm_repair_failures")
         print("❌ Auto-fix attempt failed. Returning raw output.")
         return {"error": "Invalid JSON even after fix", "raw_text": fixed_text}
 
@@ -414,73 +447,317 @@ def fix_broken_json(bad_json: str) -> dict:
 # ===========================
 # 🧭 Optimize Day Plan
 # ===========================
-def optimize_day_plan(step2_data, step3_data):
+def optimize_day_plan(step2_data, step3_data, improve=True, time_budget_sec=OPTIMIZER_TIME_BUDGET_SEC):
+    """
+    Split the spots into days of at most `max_daily_travel_min` travel.
+
+    Days are filled greedily (nearest spot to the hotel first, then nearest
+    neighbour). With `improve`, each day's visiting order is then refined with
+    2-opt and Or-opt moves until no move helps or its share of
+    `time_budget_sec` runs out; time a day leaves unused goes to the next ones.
+    """
     start_time = time.time()
 
     hotel = step2_data["hotel_location"]
     spots = step3_data["spots_distance_features"]
-    distance_matrix = step3_data["distance_matrix"]
     max_daily_travel_min = step3_data["travel_constraints"]["max_daily_travel_min"]
 
     spots.sort(key=lambda x: x["distance_from_hotel_km"])
+    select_cost, travel_cost = build_travel_time_matrix(
+        spots, step3_data["distance_matrix"], step3_data.get("travel_time_matrix_min")
+    )
+
+    routes = greedy_day_routes(select_cost, travel_cost, max_daily_travel_min)
+    if improve:
+        end = time.perf_counter() + time_budget_sec
+        for d, route in enumerate(routes):
+            share = (end - time.perf_counter()) / (len(routes) - d)
+            routes[d] = improve_route(route, select_cost, travel_cost, max_daily_travel_min, time.perf_counter() + share)
+
     days_output = {}
-    current_day = 1
-    remaining_spots = spots[:]
-    precomputed = {loc: distance_matrix.get(loc, {}) for loc in distance_matrix}
-
-    while remaining_spots:
-        day_key = f"Day {current_day}"
-        days_output[day_key] = []
-        travel_used = 0
-        current_loc = "hotel"
-
-        while remaining_spots:
-            if current_loc == "hotel":
-                next_spot = remaining_spots[0]
-                travel_time = next_spot["travel_time_min"]
+    for d, route in enumerate(routes, start=1):
+        days_output[f"Day {d}"] = [
+            {"name": spots[i - 1]["name"], "lat": spots[i - 1]["lat"], "lng": spots[i - 1]["lng"]}
+            for i in route
+        ]
+
+    days_output["hotel_location"] = hotel
+    print(f"⏱ optimize_day_plan done in {time.time() - start_time:.2f} sec")
+    return days_output
+
+
+def build_travel_time_matrix(spots, distance_matrix, time_matrix=None):
+    """
+    Index-based travel times in minutes; index 0 is the hotel, i is spots[i - 1].
+
+    Uses `time_matrix` (process_spots' travel_time_matrix_min, indexed by each
+    spot's `matrix_index`) when given, else the name-keyed `distance_matrix`.
+    Returns (select_cost, travel_cost): unknown pairs cost UNKNOWN_TRAVEL_MIN when
+    choosing the next spot but 0 when counting the day's travel, as before.
+    """
+    n = len(spots)
+    times = np.full((n + 1, n + 1), np.nan)
+
+    if time_matrix is not None and all("matrix_index" in s for s in spots):
+        idx = np.array([s["matrix_index"] for s in spots], dtype=int)
+        times[1:, 1:] = np.asarray(time_matrix, dtype=float)[np.ix_(idx, idx)]
+    else:
+        index = {s["name"]: i for i, s in enumerate(spots, start=1)}
+        for i, s in enumerate(spots, start=1):
+            for name, pair in distance_matrix.get(s["name"], {}).items():
+                j = index.get(name)
+                if j is not None and j != i and "time_min" in pair:
+                    times[i, j] = pair["time_min"]
+
+    np.fill_diagonal(times, 0.0)
+    times[:, 0] = 0.0  # the return to the hotel is not counted
+    times[0, 1:] = [s["travel_time_min"] for s in spots]
+
+    unknown = np.isnan(times)
+    return np.where(unknown, UNKNOWN_TRAVEL_MIN, times), np.where(unknown, 0.0, times)
+
+
+def greedy_day_routes(select_cost, travel_cost, max_daily_travel_min):
+    """Nearest-neighbour day filling over index matrices; returns one index list per day."""
+    n = select_cost.shape[0] - 1
+    # Taken spots get an infinite column, so each step is one argmin over a row.
+    open_cost = select_cost.astype(float)
+    open_cost[:, 0] = np.inf
+    remaining, first_open = n, 1
+    taken = np.zeros(n + 1, dtype=bool)
+    routes = []
+
+    while remaining:
+        route, travel_used, current = [], 0.0, 0
+        while remaining:
+            if current == 0:
+                # Spots are sorted by distance from the hotel: the day starts at the closest.
+                while taken[first_open]:
+                    first_open += 1
+                next_idx = first_open
             else:
-                lookup = precomputed.get(current_loc, {})
-                next_spot = min(
-                    remaining_spots,
-                    key=lambda s: lookup.get(s["name"], {}).get("time_min", 999999)
-                )
-                travel_time = lookup.get(next_spot["name"], {}).get("time_min", 0)
-
-            if travel_used + travel_time > max_daily_travel_min:
+                next_idx = int(np.argmin(open_cost[current]))
+            travel_time = travel_cost[current, next_idx]
+
+            # A day always gets at least one spot, even an unusually far one.
+            if route and travel_used + travel_time > max_daily_travel_min:
                 break
 
             travel_used += travel_time
-            days_output[day_key].append({
-                "name": next_spot["name"],
-                "lat": next_spot["lat"],
-                "lng": next_spot["lng"]
-            })
-            current_loc = next_spot["name"]
-            remaining_spots.remove(next_spot)
+            route.append(next_idx)
+            taken[next_idx] = True
+            open_cost[:, next_idx] = np.inf
+            remaining -= 1
+            current = next_idx
+
+        routes.append(route)
+
+    return routes
+
+
+def _prefix_costs(cost, order):
+    """Forward and reversed edge-cost prefix sums along `order`."""
+    fwd, rev = [0.0], [0.0]
+    for a, b in zip(order, order[1:]):
+        fwd.append(fwd[-1] + cost[a][b])
+        rev.append(rev[-1] + cost[b][a])
+    return fwd, rev
+
+
+def _two_opt_delta(cost, order, fwd, rev, i, j):
+    """Cost change of reversing order[i..j] (i >= 1) in the open path `order`."""
+    a, b, prev = order[i], order[j], order[i - 1]
+    delta = cost[prev][b] - cost[prev][a] + (rev[j] - rev[i]) - (fwd[j] - fwd[i])
+    if j + 1 < len(order):
+        nxt = order[j + 1]
+        delta += cost[a][nxt] - cost[b][nxt]
+    return delta
+
+
+def _or_opt_delta(cost, order, i, seg_len, q_node, r_node):
+    """Cost change of moving order[i:i+seg_len] between q_node and r_node (None at the path end)."""
+    first, last, prev = order[i], order[i + seg_len - 1], order[i - 1]
+    nxt = order[i + seg_len] if i + seg_len < len(order) else None
+    delta = -cost[prev][first]
+    if nxt is not None:
+        delta += cost[prev][nxt] - cost[last][nxt]
+    delta += cost[q_node][first]
+    if r_node is not None:
+        delta += cost[last][r_node] - cost[q_node][r_node]
+    return delta
+
+
+def improve_route(route, select_cost, travel_cost, max_daily_travel_min, deadline):
+    """
+    First-improvement local search on one day's open path from the hotel, until
+    `deadline` (time.perf_counter()). Moves are scored with O(1) cost deltas.
+    """
+    if len(route) < 3:
+        return route
+    nodes = [0] + [int(i) for i in route]
+    sub = np.ix_(nodes, nodes)
+    select = select_cost[sub].tolist()
+    travel = travel_cost[sub].tolist()
+    order = list(range(len(nodes)))  # local ids; order[0] is the hotel
+    k = len(order) - 1
+
+    improved = True
+    while improved:
+        improved = False
+        sel_fwd, sel_rev = _prefix_costs(select, order)
+        trv_fwd, trv_rev = _prefix_costs(travel, order)
+        travel_total = trv_fwd[-1]
+
+        # 2-opt: reverse order[i..j]
+        for i in range(1, k):
+            if time.perf_counter() > deadline:
+                return [nodes[p] for p in order[1:]]
+            for j in range(i + 1, k + 1):
+                if (_two_opt_delta(select, order, sel_fwd, sel_rev, i, j) < -1e-9
+                        and travel_total + _two_opt_delta(travel, order, trv_fwd, trv_rev, i, j) <= max_daily_travel_min):
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    improved = True
+                    break
+            if improved:
+                break
+        if improved:
+            continue
 
-        current_day += 1
+        # Or-opt: move 1–3 consecutive spots elsewhere in the day
+        for seg_len in (1, 2, 3):
+            for i in range(1, k - seg_len + 2):
+                if time.perf_counter() > deadline:
+                    return [nodes[p] for p in order[1:]]
+                rest = order[:i] + order[i + seg_len:]
+                for q in range(len(rest)):
+                    if q == i - 1:
+                        continue  # that is where the segment already is
+                    r_node = rest[q + 1] if q + 1 < len(rest) else None
+                    if (_or_opt_delta(select, order, i, seg_len, rest[q], r_node) < -1e-9
+                            and travel_total + _or_opt_delta(travel, order, i, seg_len, rest[q], r_node) <= max_daily_travel_min):
+                        order = rest[:q + 1] + order[i:i + seg_len] + rest[q + 1:]
+                        improved = True
+                        break
+                if improved:
+                    break
+            if improved:
+                break
+
+    return [nodes[p] for p in order[1:]]
 
-    days_output["hotel_location"] = hotel
-    print(f"⏱ optimize_day_plan done in {time.time() - start_time:.2f} sec")
-    return days_output
 
 
+def format_itinerary_with_llm(itinerary_data, user_query, mode=PLAN_GENERATION_MODE):
+    return run_sync(aformat_itinerary_with_llm(itinerary_data, user_query, mode))
 
-def format_itinerary_with_llm(itinerary_data, user_query):
+
+async def aformat_itinerary_with_llm(itinerary_data, user_query, mode=PLAN_GENERATION_MODE):
+    """Turn the optimized day plan into PLAN_COUNT itineraries with Gemini (see aiter_itinerary_plans)."""
     start_time = time.time()
+    plans = [plan async for plan in aiter_itinerary_plans(itinerary_data, user_query, mode)]
+    print(f"⏱ format_itinerary_with_llm ({mode}) done in {time.time() - start_time:.2f} sec")
+    return plans
+
+
+async def aiter_itinerary_plans(itinerary_data, user_query, mode=PLAN_GENERATION_MODE):
+    """
+    Yield the itineraries for the optimized day plan as soon as each is ready.
+
+    mode "single" asks one call for all plans and yields them when it is done.
+    "stream" sends the same prompt but streams the answer, yielding each plan
+    as soon as its closing brace arrives. "fanout" splits the spots into
+    disjoint subsets (see split_day_plan) and writes each plan in its own,
+    smaller call, all concurrently, yielding plans as the calls finish; output
+    tokens dominate latency, so that takes about as long as one single-plan
+    call. In "stream" and "fanout" a malformed plan is repaired on its own.
+    """
+    if mode == "fanout":
+        plans = _fanout_plans(itinerary_data, user_query)
+    elif mode == "stream":
+        plans = _stream_plans(_itinerary_prompt(itinerary_data, user_query), PLAN_MAX_OUTPUT_TOKENS)
+    else:
+        for plan in await _generate_plans(_itinerary_prompt(itinerary_data, user_query), PLAN_MAX_OUTPUT_TOKENS):
+            yield plan
+        return
+    async for plan in plans:
+        yield plan
+
+
+async def _fanout_plans(itinerary_data, user_query):
+    subsets = split_day_plan(itinerary_data, PLAN_COUNT)
+    spot_names = [[s["name"] for day, spots in sub.items() if day != "hotel_location" for s in spots] for sub in subsets]
+
+    calls = []
+    for i, subset in enumerate(subsets):
+        taken = [name for j, names in enumerate(spot_names) if j != i for name in names]
+        prompt = _itinerary_prompt(subset, user_query, single_plan=True, avoid_spots=taken)
+        calls.append(asyncio.ensure_future(_generate_plans(prompt, PLAN_MAX_OUTPUT_TOKENS // PLAN_COUNT)))
 
-    prompt = f"""
+    errors, produced = [], 0
+    try:
+        for call in asyncio.as_completed(calls):
+            try:
+                plans = await call
+            except Exception as e:
+                print(f"⚠️ Plan generation failed: {e}")
+                errors.append(e)
+                continue
+            if plans:
+                produced += 1
+                yield plans[0]
+        if not produced and errors:
+            raise errors[0]
+    finally:
+        for call in calls:
+            call.cancel()
+
+
+def split_day_plan(day_plan, parts):
+    """
+    Deal each day's spots round-robin into `parts` disjoint day plans.
+
+    Every part keeps the day structure (a day's spots stay close together) and
+    the hotel; days that end up empty in a part are dropped from it.
+    """
+    subsets = [{} for _ in range(parts)]
+    days = [day for day in day_plan if day != "hotel_location"]
+    for d, day in enumerate(days):
+        spots = day_plan[day]
+        for k in range(parts):
+            # Rotate who deals first so the spots nearest the hotel don't all land in part 0.
+            share = spots[(k - d) % parts::parts]
+            if share:
+                subsets[k][day] = share
+    for subset in subsets:
+        subset["hotel_location"] = day_plan.get("hotel_location")
+    return subsets
+
+
+def _itinerary_prompt(itinerary_data, user_query, single_plan=False, avoid_spots=()):
+    """The three-plan prompt, or with `single_plan` the prompt for one plan that skips `avoid_spots`."""
+    if single_plan:
+        task = "TASK: Create **one trip plan** for the user's query below."
+        if avoid_spots:
+            task += f"\n    Other plans already use these spots, so do not include them: {', '.join(avoid_spots)}."
+        output = "Output an array containing only this plan — `[plan1]`."
+    else:
+        task = (
+            "TASK: Create **three unique trip plans** for the user's query below.\n"
+            "    Each plan must include a different set of places (no repeated spot across plans)."
+        )
+        output = "Output an array containing 3 such plans — `[plan1, plan2, plan3]`."
+
+    return f"""
     You are a professional travel planner.
 
-    TASK: Create **three unique trip plans** for the user's query below.
-    Each plan must include a different set of places (no repeated spot across plans).
+    {task}
 
     Follow these steps strictly:
     1️⃣ Group nearby spots on the same day to minimize travel.
     2️⃣ Start each day near the hotel and pick user-requested or nearby places.
     3️⃣ Allocate realistic durations (1–2h for small spots, 3–5h for beaches, etc).
     4️⃣ Each plan must be a **valid JSON object** matching the schema below.
-    5️⃣ Output an array containing 3 such plans — `[plan1, plan2, plan3]`.
+    5️⃣ {output}
 
     ⚙️ SCHEMA for each plan:
     {{
@@ -566,37 +843,68 @@ def format_itinerary_with_llm(itinerary_data, user_query):
     Now think carefully and output only the final JSON — no explanations.
     """
 
-    config = types.GenerateContentConfig(
+
+def _plan_config(max_output_tokens):
+    return types.GenerateContentConfig(
         temperature=0.6,
         top_p=0.8,
-        max_output_tokens=24000,
+        max_output_tokens=max_output_tokens,
         response_mime_type="application/json",
+        response_schema=PLANS_SCHEMA,
     )
 
-    response = _client.models.generate_content(
+
+async def _generate_plans(prompt, max_output_tokens):
+    """One Gemini call; returns the list of plans it wrote (repairing malformed JSON)."""
+    response = await get_async_models().generate_content(
         model=MODEL_ID,
         contents=prompt,
-        config=config,
+        config=_plan_config(max_output_tokens),
     )
+    return await _parse_plans(response.text.strip())
 
-    refined_output = response.text.strip()
-    print(f"⏱ format_itinerary_with_llm done in {time.time() - start_time:.2f} sec")
 
+async def _stream_plans(prompt, max_output_tokens):
+    """One streamed Gemini call; yields each plan as soon as its JSON object is complete."""
+    stream = await get_async_models().generate_content_stream(
+        model=MODEL_ID,
+        contents=prompt,
+        config=_plan_config(max_output_tokens),
+    )
+    parser = JsonArrayStream()
+    produced = 0
+    async for chunk in stream:
+        for raw in parser.feed(chunk.text or ""):
+            produced += 1
+            yield await _parse_plan(raw)
+
+    if not produced:
+        # Not an array of objects after all; fall back to parsing the whole answer.
+        for plan in await _parse_plans(parser.text.strip()):
+            yield plan
+
+
+async def _parse_plan(raw):
+    try:
+        return plan_from_schema(loads_tolerant(raw))
+    except ValueError:
+        print("⚠️ Plan JSON parsing failed, trying auto-fix")
+        return plan_from_schema(await afix_broken_json(raw))
+
+
+async def _parse_plans(refined_output):
     # ✅ Return list of itineraries safely
     try:
-        data = json.loads(refined_output)
-        if isinstance(data, dict):
-            return [data]
-        elif isinstance(data, list):
-            return data
-        else:
-            return [{"error": "Unexpected format", "raw": data}]
-    except json.JSONDecodeError:
+        data = loads_tolerant(refined_output)
+    except ValueError:
         print("⚠️ JSON parsing failed, trying auto-fix")
-        fixed = fix_broken_json(refined_output)
-        if isinstance(fixed, dict):
-            return [fixed]
-        return fixed
+        data = await afix_broken_json(refined_output)
+    if isinstance(data, dict):
+        return [plan_from_schema(data)]
+    elif isinstance(data, list):
+        return [plan_from_schema(plan) for plan in data]
+    else:
+        return [{"error": "Unexpected format", "raw": data}]
 
 
 
@@ -610,29 +918,35 @@ def haversine_km(lat1, lon1, lat2, lon2):
     return 2 * R * math.asin(math.sqrt(a))
 
 
-async def fetch_with_retry(session, url, params, retries=2):
-    for attempt in range(retries + 1):
-        try:
-            async with session.get(url, params=params, timeout=ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    return await resp.json()
-        except Exception:
-            pass
-        await asyncio.sleep(1 * (2 ** attempt))
-    return {}
+def haversine_km_array(lat0, lon0, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Vectorized haversine_km from one point to many."""
+    R = 6371.0
+    phi0, phis = np.radians(lat0), np.radians(lats)
+    dphi = phis - phi0
+    dlambda = np.radians(lons - lon0)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi0) * np.cos(phis) * np.sin(dlambda / 2) ** 2
+    return 2 * R * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+async def fetch_with_retry(session, url, params, retries=2, upstream=None, hedge=None):
+    try:
+        return await get_json_with_retry(session, url, params, upstream=upstream, hedge=hedge, max_attempts=retries + 1)
+    except Exception as e:
+        print(f"⚠️ Fetch failed: {e}")
+        return {}
 
 
 # -------------------------
 # STEP 4: Google Directions Optimization
 # -------------------------
-async def fetch_directions(session, hotel, activities):
+async def fetch_directions(session, hotel, activities, fetch=fetch_with_retry):
     """Optimize route order for the day using Google Directions API."""
     if not activities:
         return {"optimized_order": [], "polyline": None}
 
     origin = f"{hotel['lat']},{hotel['lng']}"
     waypoints = "|".join([f"{a['lat']},{a['long']}" for a in activities])
-    url = "https://maps.googleapis.com/maps/api/directions/json"
+    url = f"{GOOGLE_MAPS_BASE_URL}/maps/api/directions/json"
     params = {
         "origin": origin,
         "destination": origin,
@@ -641,7 +955,7 @@ async def fetch_directions(session, hotel, activities):
         "key": GOOGLE_MAPS_API_KEY,
     }
 
-    data = await fetch_with_retry(session, url, params)
+    data = await fetch(session, url, params, upstream="directions", hedge="directions")
     if data.get("status") == "OK":
         route = data["routes"][0]
         order = route.get("waypoint_order", [])
@@ -653,12 +967,21 @@ async def fetch_directions(session, hotel, activities):
 # -------------------------
 # STEP 5: Weather Fetch
 # -------------------------
-async def fetch_weather(session, lat, lon):
-    """Fetch compact current weather (fast version)."""
-    url = "https://api.openweathermap.org/data/2.5/weather"
+async def fetch_weather(session, lat, lon, fetch=fetch_with_retry):
+    """Fetch compact current weather, once per ~5 km grid cell (see weather_cache.py)."""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return "unknown"
+
+    return await cached_weather(lat, lon, lambda cell_lat, cell_lon: _fetch_weather_condition(session, cell_lat, cell_lon, fetch))
+
+
+async def _fetch_weather_condition(session, lat, lon, fetch):
+    url = f"{OPENWEATHER_BASE_URL}/data/2.5/weather"
     params = {"lat": lat, "lon": lon, "appid": OPENWEATHER_API_KEY, "units": "metric"}
 
-    data = await fetch_with_retry(session, url, params)
+    data = await fetch(session, url, params, upstream="openweather")
     if not data or "weather" not in data:
         return "unknown"
 
@@ -676,7 +999,7 @@ async def fetch_weather(session, lat, lon):
 # -------------------------
 # CORE ASYNC PROCESSOR
 # -------------------------
-async def process_single_trip(step3):
+async def process_single_trip(step3, fetch=fetch_with_retry):
     """Process one trip dict and enrich with route + weather."""
     hotel = step3.get("hotel", {"lat": 0, "lng": 0, "name": "Unknown"})
     itinerary_name = step3.get("itinerary_name")
@@ -685,17 +1008,17 @@ async def process_single_trip(step3):
 
     start_date = date.fromisoformat(step3.get("date", date.today().isoformat()))
 
-    async with aiohttp.ClientSession() as session:
-        async with asyncio.TaskGroup() as tg:
-            route_tasks, weather_tasks = [], []
+    session = get_session()
+    async with asyncio.TaskGroup() as tg:
+        route_tasks, weather_tasks = [], []
 
-            for i, (day_name, activities) in enumerate(days.items()):
-                route_tasks.append(tg.create_task(fetch_directions(session, hotel, activities)))
-                for act in activities:
-                    weather_tasks.append(tg.create_task(fetch_weather(session, act["lat"], act["long"])))
+        for i, (day_name, activities) in enumerate(days.items()):
+            route_tasks.append(tg.create_task(fetch_directions(session, hotel, activities, fetch)))
+            for act in activities:
+                weather_tasks.append(tg.create_task(fetch_weather(session, act["lat"], act["long"], fetch)))
 
-        routes = [t.result() for t in route_tasks]
-        weathers = [t.result() for t in weather_tasks]
+    routes = [t.result() for t in route_tasks]
+    weathers = [t.result() for t in weather_tasks]
 
     # Attach weather info
     wi = 0
@@ -724,33 +1047,76 @@ async def process_single_trip(step3):
 # -------------------------
 # PUBLIC ENTRY FUNCTION
 # -------------------------
-async def run_itinerary_pipeline(step3_data):
+async def run_itinerary_pipeline(step3_data, on_trip=None):
     """
     Accepts either:
       - a single itinerary dict, or
       - a list of itinerary dicts
     Runs async optimization + weather and returns final structured output.
+    All trips are enriched concurrently; `on_trip(index, trip)` is called as
+    soon as each one is done.
     """
     t0 = time.time()
+    fetch = SharedFetch(fetch_with_retry)
+
+    async def enrich(i, trip):
+        result = await process_single_trip(trip, fetch)
+        if on_trip:
+            on_trip(i, result)
+        return result
+
+    if isinstance(step3_data, list):
+        final_output = list(await asyncio.gather(*[enrich(i, trip) for i, trip in enumerate(step3_data)]))
+    else:
+        final_output = await enrich(0, step3_data)
+    _finish_pipeline(final_output, fetch, t0)
+    return final_output
 
-    async def runner():
-        if isinstance(step3_data, list):
-            results = []
-            for trip in step3_data:
-                results.append(await process_single_trip(trip))
-            return results
-        else:
-            return await process_single_trip(step3_data)
 
-    final_output = await runner()
+async def plan_and_enrich(itinerary_data, user_query, on_plan=None, on_trip=None, mode=PLAN_GENERATION_MODE):
+    """
+    format_itinerary_with_llm + run_itinerary_pipeline, overlapped.
+
+    Each plan's weather and route enrichment starts the moment the plan is
+    generated (see aiter_itinerary_plans), so with "stream" or "fanout" plan 1
+    is being enriched while plans 2 and 3 are still being written.
+    `on_plan(index, plan)` / `on_trip(index, trip)` are called as each plan is
+    generated / enriched. Returns (plans, enriched trips), both in generation order.
+    """
+    t0 = time.time()
+    fetch = SharedFetch(fetch_with_retry)
+    plans, tasks = [], []
 
+    async def enrich(i, trip):
+        result = await process_single_trip(trip, fetch)
+        if on_trip:
+            on_trip(i, result)
+        return result
+
+    try:
+        async for plan in aiter_itinerary_plans(itinerary_data, user_query, mode):
+            i = len(plans)
+            plans.append(plan)
+            if on_plan:
+                on_plan(i, plan)
+            tasks.append(asyncio.ensure_future(enrich(i, plan)))
+        print(f"⏱ Plans generated ({mode}) in {time.time() - t0:.2f}s")
+        final_output = list(await asyncio.gather(*tasks))
+    finally:
+        for task in tasks:
+            task.cancel()
+    _finish_pipeline(final_output, fetch, t0)
+    return plans, final_output
+
+
+def _finish_pipeline(final_output, fetch, t0):
+    print(f"🔁 Enrichment lookups: {fetch.requested} requested, {fetch.deduplicated} shared between plans")
 
     # Save file (optional)
     with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
         json.dump(final_output, f, indent=2, ensure_ascii=False)
 
     print(f"✅ Done! Route + Weather enriched. Took {time.time() - t0:.2f}s")
-    return final_output
 
 
 
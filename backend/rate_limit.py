@@ -0,0 +1,164 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# -------------------------
+# CONFIG
+# -------------------------
+# Per upstream: (requests/sec, burst, max in flight), overridable with
+# RATE_LIMIT_<NAME>_QPS / _BURST / _CONCURRENCY. Limits are per worker process;
+# divide the project quota by the number of workers.
+DEFAULT_LIMITS = {
+    "places": (50.0, 50, 20),
+    "distance_matrix": (10.0, 10, 8),  # ~1000 elements/s at 100 elements per request
+    "directions": (50.0, 50, 20),
+    "openweather": (10.0, 20, 10),
+    "amadeus": (10.0, 10, 5),  # test environment: 10 TPS
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket. `reserve()` takes a token and returns how long to wait for it."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Going negative queues callers behind each other at exactly `rate`.
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def try_reserve(self) -> bool:
+        """Take a token only if one is free right now."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class Upstream:
+    """
+    Rate and concurrency limits for one upstream API, shared by async and sync callers.
+
+        async with limiter("places").limit(): ...
+        with limiter("amadeus").limit_sync(): ...
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_concurrency: int):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self._async_sems: dict = {}  # asyncio primitives are loop-bound
+        self._sync_sem = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "throttled": 0, "wait_sec": 0.0, "in_flight": 0, "peak_in_flight": 0}
+
+    def _async_sem(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for old_loop in [l for l in self._async_sems if l.is_closed()]:
+                del self._async_sems[old_loop]
+            sem = self._async_sems.get(loop)
+            if sem is None:
+                sem = self._async_sems[loop] = asyncio.Semaphore(self.max_concurrency)
+        return sem
+
+    def _enter(self, waited: float):
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["in_flight"] += 1
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._stats["in_flight"])
+            if waited > 0:
+                self._stats["throttled"] += 1
+                self._stats["wait_sec"] += waited
+
+    def _exit(self):
+        with self._lock:
+            self._stats["in_flight"] -= 1
+
+    @asynccontextmanager
+    async def limit(self):
+        t0 = time.monotonic()
+        async with self._async_sem():
+            delay = self.bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._enter(time.monotonic() - t0 if delay > 0 else 0.0)
+            try:
+                yield
+            finally:
+                self._exit()
+
+    @asynccontextmanager
+    async def try_limit(self):
+        """`limit` that never queues: yields False, holding nothing, when no slot or token is free."""
+        sem = self._async_sem()
+        if sem.locked() or not self.bucket.try_reserve():
+            yield False
+            return
+        async with sem:  # free slot: acquired without waiting
+            self._enter(0.0)
+            try:
+                yield True
+            finally:
+                self._exit()
+
+    @contextmanager
+    def limit_sync(self):
+        t0 = time.monotonic()
+        with self._sync_sem:
+            delay = self.bucket.reserve()
+            if delay > 0:
+                time.sleep(delay)
+            self._enter(time.monotonic() - t0 if delay > 0 else 0.0)
+            try:
+                yield
+            finally:
+                self._exit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["wait_sec"] = round(stats["wait_sec"], 3)
+        stats["qps"] = self.bucket.rate
+        stats["max_concurrency"] = self.max_concurrency
+        return stats
+
+
+def _from_env(name: str, default: tuple) -> Upstream:
+    rate, burst, concurrency = default
+    prefix = f"RATE_LIMIT_{name.upper()}"
+    return Upstream(
+        name,
+        float(os.getenv(f"{prefix}_QPS", rate)),
+        int(os.getenv(f"{prefix}_BURST", burst)),
+        int(os.getenv(f"{prefix}_CONCURRENCY", concurrency)),
+    )
+
+
+_upstreams = {name: _from_env(name, limits) for name, limits in DEFAULT_LIMITS.items()}
+
+
+def limiter(name: str) -> Upstream:
+    return _upstreams[name]
+
+
+def get_rate_limit_stats() -> dict:
+    return {name: u.stats() for name, u in _upstreams.items()}
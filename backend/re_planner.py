@@ -1,12 +1,23 @@
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 from dotenv import load_dotenv
-import httpx
 from typing import Dict, List, Tuple
 import os
 import math
 from datetime import date, timedelta
-from aiohttp import ClientSession, ClientTimeout
+import numpy as np
+from http_client import get_session
+from distance_matrix import build_travel_matrix, point_key
+from vertex_client import get_async_models
+from event_loop import run_sync
+from json_repair import count_repair, loads_tolerant
+from plan_schema import PLANS_SCHEMA, plan_from_schema
+from shared_fetch import SharedFetch
+from retry import get_json_with_retry
+from planner import find_hotel_index
+from weather_cache import cached_weather
+from intent_cache import cached_trip_details, enhance_intent_cache
+from places_cache import CACHEABLE_STATUSES, details_cache, text_search_cache, text_search_key
 
 
 # -------------------------
@@ -27,6 +38,8 @@ MODEL_ID = os.getenv("MODEL_ID_PLANNER")
 SCOPES = os.getenv("SCOPES").split(",") if os.getenv("SCOPES") else []
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com")
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org")
 
 # MODEL_ID = "gemini-2.5-pro"
 MODEL_ID= "gemini-2.5-flash"
@@ -55,22 +68,20 @@ class TripDetails(BaseModel):
 
 # --- Vertex AI Structured Extraction ---
 def get_structured_trip_details(user_prompt: str) -> Optional[TripDetails]:
+    """Structured trip intent, from the intent cache when a same-meaning prompt was seen recently."""
+    return run_sync(aget_structured_trip_details(user_prompt))
+
+
+async def aget_structured_trip_details(user_prompt: str) -> Optional[TripDetails]:
+    return await cached_trip_details(enhance_intent_cache, user_prompt, _extract_trip_details, TripDetails)
+
+
+async def _extract_trip_details(user_prompt: str) -> Optional[TripDetails]:
     if not os.path.exists(SERVICE_ACCOUNT_PATH):
         print(f"Error: Service account not found: {SERVICE_ACCOUNT_PATH}")
         return None
 
     try:
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_PATH, scopes=SCOPES
-        )
-
-        client = genai.Client(
-            vertexai=True,
-            project=VERTEX_PROJECT,
-            location=VERTEX_LOCATION,
-            credentials=credentials
-        )
-
         system_instruction = (
             "You are an expert travel planner assistant. Convert the user's text into structured JSON only. "
             "Follow these rules:\n"
@@ -113,7 +124,7 @@ def get_structured_trip_details(user_prompt: str) -> Optional[TripDetails]:
             "}"
         )
 
-        response = client.models.generate_content(
+        response = await get_async_models(VERTEX_PROJECT, VERTEX_LOCATION).generate_content(
             model=MODEL_ID,
             contents=user_prompt,
             config=types.GenerateContentConfig(
@@ -133,34 +144,51 @@ def get_structured_trip_details(user_prompt: str) -> Optional[TripDetails]:
 
 
 import asyncio
-import aiohttp
 import random
 import json
 
 MIN_RATING = 3.5
 
 
-async def fetch_json(session, url, params):
-    async with session.get(url, params=params) as response:
-        return await response.json()
+async def fetch_json(session, url, params, upstream="places", hedge=None):
+    try:
+        return await get_json_with_retry(session, url, params, upstream=upstream, hedge=hedge)
+    except Exception as e:
+        print(f"⚠️ {upstream} request failed: {e}")
+        return {}
 
 
 async def places_text_search(session, query, location):
-    url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+    cache_key = text_search_key(query, location)
+    cached = await text_search_cache.aget(cache_key)
+    if cached is not None:
+        return cached
+
+    url = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/textsearch/json"
     params = {"query": f"{query} in {location}", "key": GOOGLE_MAPS_API_KEY}
     data = await fetch_json(session, url, params)
-    return data.get("results", [])
+    results = data.get("results", [])
+    if data.get("status") in CACHEABLE_STATUSES:
+        await text_search_cache.aset(cache_key, results)
+    return results
 
 
 async def place_details(session, place_id):
-    url = "https://maps.googleapis.com/maps/api/place/details/json"
+    cached = await details_cache.aget(place_id)
+    if cached is not None:
+        return cached
+
+    url = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/details/json"
     params = {
         "place_id": place_id,
         "fields": "place_id,name,geometry,rating,opening_hours,types",
         "key": GOOGLE_MAPS_API_KEY,
     }
-    data = await fetch_json(session, url, params)
-    return data.get("result")
+    data = await fetch_json(session, url, params, hedge="place_details")
+    result = data.get("result")
+    if result and data.get("status") in CACHEABLE_STATUSES:
+        await details_cache.aset(place_id, result)
+    return result
 
 
 def fetch_spot_data(place):
@@ -196,18 +224,19 @@ async def run_step2(input_data):
                      ]
 
     all_spots = []
-    async with aiohttp.ClientSession() as session:
-        # Step 1: Run all text searches concurrently
-        search_tasks = [places_text_search(session, q, destination) for q in search_queries]
-        search_results = await asyncio.gather(*search_tasks)
-        search_results = [r for results in search_results for r in results]
-
-        # Step 2: Filter & fetch details concurrently
-        detail_tasks = [
-            place_details(session, r["place_id"])
-            for r in search_results if r.get("rating", 0) >= MIN_RATING
-        ]
-        details_list = await asyncio.gather(*detail_tasks)
+    session = get_session()
+
+    # Step 1: Run all text searches concurrently
+    search_tasks = [places_text_search(session, q, destination) for q in search_queries]
+    search_results = await asyncio.gather(*search_tasks)
+    search_results = [r for results in search_results for r in results]
+
+    # Step 2: Filter & fetch details concurrently
+    detail_tasks = [
+        place_details(session, r["place_id"])
+        for r in search_results if r.get("rating", 0) >= MIN_RATING
+    ]
+    details_list = await asyncio.gather(*detail_tasks)
 
     for d in details_list:
         if d and d.get("geometry", {}).get("location"):
@@ -227,26 +256,6 @@ async def run_step2(input_data):
 # -------------------------
 # HELPER FUNCTIONS
 # -------------------------
-async def build_distance_matrix_async(
-        origins: List[Tuple[float, float]], destinations: List[Tuple[float, float]]
-) -> Dict:
-    """Asynchronous Google Distance Matrix API call."""
-    url = "https://maps.googleapis.com/maps/api/distancematrix/json"
-    origin_str = "|".join([f"{lat},{lng}" for lat, lng in origins])
-    dest_str = "|".join([f"{lat},{lng}" for lat, lng in destinations])
-    params = {
-        "origins": origin_str,
-        "destinations": dest_str,
-        "key": GOOGLE_MAPS_API_KEY,
-        "units": "metric",
-    }
-
-    async with httpx.AsyncClient(timeout=20) as client:
-        response = await client.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
-
-
 def estimate_travel_cost(distance_km: float) -> int:
     """Estimate travel cost (₹) based on distance."""
     return int(distance_km * PER_KM_COST)
@@ -262,29 +271,44 @@ async def process_spots(step2_data: Dict) -> Dict:
     hotel = step2_data["hotel_location"]
     spots = step2_data["spots"]
 
-    origins = [(hotel["lat"], hotel["lng"])]
-    destinations = [(s["lat"], s["lng"]) for s in spots]
+    # -------------------------
+    # STEP 3.1 — ONE TILED MATRIX FOR HOTEL + SPOTS
+    # -------------------------
+    # Same engine as planner.py: the hotel is picked from the spots, so its row
+    # of the spot matrix is the hotel ➜ spots row. Both directions of a pair are
+    # fetched unless DM_SYMMETRIC=1 (see distance_matrix.py).
+    points = [(s["lat"], s["lng"]) for s in spots]
+    keys = [point_key(s["lat"], s["lng"], s.get("id")) for s in spots]
+    n = len(spots)
+    hotel_idx = find_hotel_index(hotel, spots)
+
+    need = ~np.eye(n, dtype=bool)
+    if hotel_idx is None and hotel.get("lat") is not None:
+        points.append((hotel["lat"], hotel["lng"]))
+        keys.append(point_key(hotel["lat"], hotel["lng"], hotel.get("id")))
+        hotel_idx = n
+        need = np.pad(need, ((0, 1), (0, 1)))
+        need[hotel_idx, :n] = True
+
+    print("\n🚀 STEP 3.1: Calling Distance Matrix API for Hotel + Spots (tiled, cached pairs skipped)...")
+    start_matrix = time.time()
+    distance_m, duration_s = await build_travel_matrix(points, need, keys=keys)
+    matrix_time = round(time.time() - start_matrix, 2)
+    print(f"✅ Distance Matrix completed in {matrix_time}s")
 
     # -------------------------
-    # STEP 3.1 — HOTEL ➜ SPOTS
+    # STEP 3.2 — HOTEL ➜ SPOTS FEATURES
     # -------------------------
-    print("\n🚀 STEP 3.1: Calling Distance Matrix API for Hotel ➜ Spots...")
     start_hotel_to_spots = time.time()
-
-    dm_response = await build_distance_matrix_async(origins, destinations)
-
-    hotel_to_spots_time = round(time.time() - start_hotel_to_spots, 2)
-
     results = []
     budget_used = 0
 
-    for i, row in enumerate(dm_response["rows"][0]["elements"]):
-        spot = spots[i]
-        if row["status"] != "OK":
+    for i, spot in enumerate(spots):
+        if hotel_idx is None or np.isnan(distance_m[hotel_idx, i]):
             continue
 
-        dist_km = round(row["distance"]["value"] / 1000, 2)
-        time_min = round(row["duration"]["value"] / 60, 1)
+        dist_km = round(float(distance_m[hotel_idx, i]) / 1000, 2)
+        time_min = round(float(duration_s[hotel_idx, i]) / 60, 1)
 
         if dist_km > MAX_TRAVEL_DISTANCE_PER_SPOT:
             continue
@@ -302,45 +326,27 @@ async def process_spots(step2_data: Dict) -> Dict:
             "lng": spot["lng"]
         })
 
-    print(f"✅ Hotel ➜ Spots completed in {hotel_to_spots_time}s")
+    hotel_to_spots_time = round(time.time() - start_hotel_to_spots, 2)
 
     # -------------------------
-    # STEP 3.2 — SPOT ➜ SPOT (PARALLEL)
+    # STEP 3.3 — SPOT ➜ SPOT LOOKUP
     # -------------------------
-    print("\n🌍 STEP 3.2: Calling Distance Matrix API for Spot ➜ Spot (parallel)...")
     start_spot_to_spot = time.time()
-
-    async def spot_to_spot_matrix(s1):
-        o = [(s1["lat"], s1["lng"])]
-        d = [(s2["lat"], s2["lng"]) for s2 in spots if s2["name"] != s1["name"]]
-        try:
-            dm_pair = await build_distance_matrix_async(o, d)
-            matrix = {}
-            j = 0
-            for s2 in spots:
-                if s2["name"] == s1["name"]:
-                    continue
-                el = dm_pair["rows"][0]["elements"][j]
-                j += 1
-                if el["status"] != "OK":
-                    continue
-                matrix[s2["name"]] = {
-                    "distance_km": round(el["distance"]["value"] / 1000, 1),
-                    "time_min": round(el["duration"]["value"] / 60, 1)
-                }
-            return s1["name"], matrix
-        except Exception as e:
-            print(f"❌ Error for {s1['name']}: {e}")
-            return s1["name"], {}
-
-    pair_tasks = [spot_to_spot_matrix(s) for s in spots]
-    pair_results = await asyncio.gather(*pair_tasks)
-    pair_matrix = dict(pair_results)
+    pair_matrix = {}
+    for i, s1 in enumerate(spots):
+        matrix = {}
+        for j, s2 in enumerate(spots):
+            if s2["name"] == s1["name"] or np.isnan(distance_m[i, j]):
+                continue
+            matrix[s2["name"]] = {
+                "distance_km": round(float(distance_m[i, j]) / 1000, 1),
+                "time_min": round(float(duration_s[i, j]) / 60, 1)
+            }
+        pair_matrix[s1["name"]] = matrix
 
     spot_to_spot_time = round(time.time() - start_spot_to_spot, 2)
     total_time = round(time.time() - start_total, 2)
 
-    print(f"✅ Spot ➜ Spot completed in {spot_to_spot_time}s")
     print(f"\n⏱️ TOTAL Step 3 processing time: {total_time}s")
 
     # -------------------------
@@ -354,6 +360,7 @@ async def process_spots(step2_data: Dict) -> Dict:
             "max_daily_travel_min": MAX_DAILY_TRAVEL_MIN
         },
         "time_taken": {
+            "distance_matrix_sec": matrix_time,
             "hotel_to_spots_sec": hotel_to_spots_time,
             "spot_to_spot_sec": spot_to_spot_time,
             "total_step3_sec": total_time
@@ -365,7 +372,6 @@ import json
 import time
 from google import genai
 from google.genai import types
-from google.oauth2 import service_account
 
 # ===========================
 # 🔧 CONFIG
@@ -379,24 +385,20 @@ SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
 # MODEL_ID= "gemini-2.5-flash"
 MODEL_ID = "gemini-2.5-flash-lite"
 
-# ✅ Initialize globally (no re-auth)
-_credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_PATH, scopes=SCOPES
-)
-_client = genai.Client(
-    vertexai=True,
-    project=VERTEX_PROJECT,
-    location=VERTEX_LOCATION,
-    credentials=_credentials
-)
+# ✅ Shared client (see vertex_client.py): credentials load once, token refreshed in the background
 
 
 # ===========================
 # 🧩 Helper — JSON Auto Fixer
 # ===========================
 def fix_broken_json(bad_json: str) -> dict:
-    """Repair malformed or truncated JSON using Gemini safely."""
+    return run_sync(afix_broken_json(bad_json))
+
+
+async def afix_broken_json(bad_json: str) -> dict:
+    """Repair malformed or truncated JSON using Gemini (last resort, after json_repair.loads_tolerant)."""
     print("⚙️ Attempting to auto-fix malformed JSON...")
+    count_repair("llm_repairs")
     repair_prompt = f"""
     The following JSON is invalid or incomplete.
     Your job is to **only repair** structural issues (missing commas, brackets, quotes)
@@ -413,7 +415,7 @@ def fix_broken_json(bad_json: str) -> dict:
         response_mime_type="application/json",
         temperature=0.0,
     )
-    repair_response = _client.models.generate_content(
+    repair_response = await get_async_models(VERTEX_PROJECT, VERTEX_LOCATION).generate_content(
         model=MODEL_ID,
         contents=repair_prompt,
         config=repair_config,
@@ -423,6 +425,7 @@ def fix_broken_json(bad_json: str) -> dict:
     try:
         return json.loads(fixed_text)
     except Exception:
+        count_repair("llm_repair_failures")
         print("❌ Auto-fix attempt failed. Returning raw output.")
         return {"error": "Invalid JSON even after fix", "raw_text": fixed_text}
 
@@ -482,6 +485,10 @@ def optimize_day_plan(step2_data, step3_data):
 
 
 def format_itinerary_with_llm(itinerary_data, user_query, plan):
+    return run_sync(aformat_itinerary_with_llm(itinerary_data, user_query, plan))
+
+
+async def aformat_itinerary_with_llm(itinerary_data, user_query, plan):
     start_time = time.time()
 
     from datetime import datetime
@@ -603,9 +610,10 @@ def format_itinerary_with_llm(itinerary_data, user_query, plan):
         top_p=0.8,
         max_output_tokens=24000,
         response_mime_type="application/json",
+        response_schema=PLANS_SCHEMA,
     )
 
-    response = _client.models.generate_content(
+    response = await get_async_models(VERTEX_PROJECT, VERTEX_LOCATION).generate_content(
         model=MODEL_ID,
         contents=prompt,
         config=config,
@@ -616,19 +624,16 @@ def format_itinerary_with_llm(itinerary_data, user_query, plan):
 
     # ✅ Return list of itineraries safely
     try:
-        data = json.loads(refined_output)
-        if isinstance(data, dict):
-            return [data]
-        elif isinstance(data, list):
-            return data
-        else:
-            return [{"error": "Unexpected format", "raw": data}]
-    except json.JSONDecodeError:
+        data = loads_tolerant(refined_output)
+    except ValueError:
         print("⚠️ JSON parsing failed, trying auto-fix")
-        fixed = fix_broken_json(refined_output)
-        if isinstance(fixed, dict):
-            return [fixed]
-        return fixed
+        data = await afix_broken_json(refined_output)
+    if isinstance(data, dict):
+        return [plan_from_schema(data)]
+    elif isinstance(data, list):
+        return [plan_from_schema(plan) for plan in data]
+    else:
+        return [{"error": "Unexpected format", "raw": data}]
 
 
 # !/usr/bin/env python3
@@ -650,30 +655,30 @@ def haversine_km(lat1, lon1, lat2, lon2):
     return 2 * R * math.asin(math.sqrt(a))
 
 
-async def fetch_with_retry(session, url, params, retries=2):
-    for attempt in range(retries + 1):
-        try:
-            async with session.get(url, params=params, timeout=ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    return await resp.json()
-        except Exception as e:
-            print(f"⚠️ Fetch attempt {attempt + 1} failed: {e}")
-        await asyncio.sleep(1 * (2 ** attempt))
-    return {}
+async def fetch_with_retry(session, url, params, retries=2, upstream=None, hedge=None):
+    try:
+        return await get_json_with_retry(session, url, params, upstream=upstream, hedge=hedge, max_attempts=retries + 1)
+    except Exception as e:
+        print(f"⚠️ Fetch failed: {e}")
+        return {}
 
 
-async def fetch_weather(session, lat, lon):
-    """Fetch compact current weather (fast version)."""
+async def fetch_weather(session, lat, lon, fetch=fetch_with_retry):
+    """Fetch compact current weather, once per ~5 km grid cell (see weather_cache.py)."""
     try:
         lat = float(lat)
         lon = float(lon)
     except (TypeError, ValueError):
         return "unknown"
 
-    url = "https://api.openweathermap.org/data/2.5/weather"
+    return await cached_weather(lat, lon, lambda cell_lat, cell_lon: _fetch_weather_condition(session, cell_lat, cell_lon, fetch))
+
+
+async def _fetch_weather_condition(session, lat, lon, fetch):
+    url = f"{OPENWEATHER_BASE_URL}/data/2.5/weather"
     params = {"lat": lat, "lon": lon, "appid": OPENWEATHER_API_KEY, "units": "metric"}
 
-    data = await fetch_with_retry(session, url, params)
+    data = await fetch(session, url, params, upstream="openweather")
     if not data or "weather" not in data:
         return "unknown"
 
@@ -691,7 +696,7 @@ async def fetch_weather(session, lat, lon):
 # -------------------------
 # CORE ASYNC PROCESSOR
 # -------------------------
-async def process_single_trip(trip):
+async def process_single_trip(trip, fetch=fetch_with_retry):
     """Process one trip dict and enrich with weather info."""
     hotel = trip.get("hotel", {})
     hotel["lng"] = hotel.get("lng") or hotel.get("long") or 0
@@ -705,14 +710,14 @@ async def process_single_trip(trip):
         start_date = date.today()
 
     # Fetch weather for all activities
-    async with ClientSession() as session:
-        async with asyncio.TaskGroup() as tg:
-            weather_tasks = [
-                tg.create_task(fetch_weather(session, act.get("lat"), act.get("long")))
-                for _, activities in days.items()
-                for act in activities
-            ]
-        weathers = [t.result() for t in weather_tasks]
+    session = get_session()
+    async with asyncio.TaskGroup() as tg:
+        weather_tasks = [
+            tg.create_task(fetch_weather(session, act.get("lat"), act.get("long"), fetch))
+            for _, activities in days.items()
+            for act in activities
+        ]
+    weathers = [t.result() for t in weather_tasks]
 
     # Attach weather to each activity
     wi = 0
@@ -742,12 +747,12 @@ async def process_single_trip(trip):
 async def run_itinerary_pipeline(step3_data):
     """Main async handler for list or single item."""
     t0 = time.time()
+    fetch = SharedFetch(fetch_with_retry)
 
     if isinstance(step3_data, list):
-        results = [await process_single_trip(trip) for trip in step3_data]
-        final_output = results
+        final_output = list(await asyncio.gather(*[process_single_trip(trip, fetch) for trip in step3_data]))
     else:
-        final_output = await process_single_trip(step3_data)
+        final_output = await process_single_trip(step3_data, fetch)
 
     print(f"✅ Done! Took {time.time() - t0:.2f}s")
     return final_output
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import random
+import time
+from contextlib import nullcontext
+from typing import Awaitable, Callable, Optional
+
+import aiohttp
+import requests
+from aiohttp import ClientTimeout
+from dotenv import load_dotenv
+from hedging import hedged
+from rate_limit import limiter
+load_dotenv()
+
+# -------------------------
+# CONFIG
+# -------------------------
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_DEADLINE_SEC = float(os.getenv("RETRY_DEADLINE_SEC", "15"))  # whole call, all attempts and sleeps included
+RETRY_ATTEMPT_TIMEOUT_SEC = float(os.getenv("RETRY_ATTEMPT_TIMEOUT_SEC", "10"))
+RETRY_BASE_DELAY_SEC = float(os.getenv("RETRY_BASE_DELAY_SEC", "0.2"))
+RETRY_MAX_DELAY_SEC = float(os.getenv("RETRY_MAX_DELAY_SEC", "2.0"))
+RETRY_MIN_ATTEMPT_SEC = 0.5  # don't start an attempt with less time than this left
+
+# Google APIs report quota and transient failures in the body with HTTP 200.
+GOOGLE_RETRYABLE_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+RETRYABLE_EXCEPTIONS = (
+    asyncio.TimeoutError,
+    aiohttp.ClientConnectionError,
+    aiohttp.ClientPayloadError,
+    requests.ConnectionError,
+    requests.Timeout,
+)
+
+
+class RetryableError(Exception):
+    """A failed attempt worth repeating (5xx, 429, quota status)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, response=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.response = response
+
+
+def is_retryable_status(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+def _retry_after(headers) -> Optional[float]:
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int, retry_after: Optional[float]) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After when it sent one."""
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(RETRY_MAX_DELAY_SEC, RETRY_BASE_DELAY_SEC * 2 ** attempt))
+
+
+def _next_delay(e: Exception, attempt: int, max_attempts: int, deadline: float) -> Optional[float]:
+    """Seconds to wait before the next attempt, or None to give up now."""
+    if attempt + 1 >= max_attempts:
+        return None
+    delay = _backoff(attempt, getattr(e, "retry_after", None))
+    if time.monotonic() + delay + RETRY_MIN_ATTEMPT_SEC > deadline:
+        return None
+    return delay
+
+
+# -------------------------
+# RETRY LOOPS
+# -------------------------
+async def call_with_retry(
+    attempt_fn: Callable[[float], Awaitable],
+    deadline_sec: float = RETRY_DEADLINE_SEC,
+    max_attempts: int = RETRY_MAX_ATTEMPTS,
+    attempt_timeout_sec: float = RETRY_ATTEMPT_TIMEOUT_SEC,
+):
+    """
+    Run `attempt_fn(timeout_sec)` until it succeeds, fails permanently or the deadline passes.
+
+    RetryableError and connection/timeout errors are retried with jittered
+    backoff; anything else (e.g. a 4xx) propagates at once. `attempt_fn` must
+    apply the timeout it is given (clipped to the time left) to the request
+    itself, so time spent queued in a rate limiter doesn't count. No sleep runs
+    past the deadline, and the last error is re-raised when giving up.
+    """
+    deadline = time.monotonic() + deadline_sec
+    for attempt in range(max_attempts):
+        timeout = min(attempt_timeout_sec, deadline - time.monotonic())
+        try:
+            return await attempt_fn(timeout)
+        except (RetryableError, *RETRYABLE_EXCEPTIONS) as e:
+            delay = _next_delay(e, attempt, max_attempts, deadline)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+
+
+def call_with_retry_sync(
+    attempt_fn: Callable[[float], object],
+    deadline_sec: float = RETRY_DEADLINE_SEC,
+    max_attempts: int = RETRY_MAX_ATTEMPTS,
+    attempt_timeout_sec: float = RETRY_ATTEMPT_TIMEOUT_SEC,
+):
+    """Blocking twin of call_with_retry."""
+    deadline = time.monotonic() + deadline_sec
+    for attempt in range(max_attempts):
+        timeout = min(attempt_timeout_sec, deadline - time.monotonic())
+        try:
+            return attempt_fn(timeout)
+        except (RetryableError, *RETRYABLE_EXCEPTIONS) as e:
+            delay = _next_delay(e, attempt, max_attempts, deadline)
+            if delay is None:
+                raise
+            time.sleep(delay)
+
+
+# -------------------------
+# HTTP HELPERS
+# -------------------------
+async def get_json_with_retry(
+    session, url, params, upstream: Optional[str] = None, hedge: Optional[str] = None, **retry_kwargs
+):
+    """
+    GET JSON through the upstream's rate limiter, retrying 5xx/429/quota answers.
+
+    With `hedge` (an endpoint name, see hedging.py) each attempt may be
+    duplicated when its request runs slower than that endpoint usually does.
+    Only the request is timed, after the limiter admits it, and the duplicate
+    is sent only if the limiter has room for it without queueing.
+    """
+    async def attempt(timeout):
+        async with limiter(upstream).limit() if upstream else nullcontext():
+            if hedge:
+                admit = limiter(upstream).try_limit if upstream else None
+                return await hedged(hedge, lambda: request_once(timeout), admit)
+            return await request_once(timeout)
+
+    async def request_once(timeout):
+        async with session.get(url, params=params, timeout=ClientTimeout(total=timeout)) as resp:
+            if is_retryable_status(resp.status):
+                raise RetryableError(f"HTTP {resp.status}", _retry_after(resp.headers))
+            resp.raise_for_status()
+            data = await resp.json(content_type=None)
+        if isinstance(data, dict) and data.get("status") in GOOGLE_RETRYABLE_STATUSES:
+            raise RetryableError(data["status"])
+        return data
+
+    return await call_with_retry(attempt, **retry_kwargs)
+
+
+def request_with_retry(method: str, url: str, upstream: Optional[str] = None, retry_kwargs=None, **kwargs) -> requests.Response:
+    """
+    `requests.request` with the same retry policy.
+
+    Returns the last response even when retries run out on a 5xx/429, so
+    callers keep using `raise_for_status()`; 4xx responses come back at once.
+    """
+    def attempt(timeout):
+        with limiter(upstream).limit_sync() if upstream else nullcontext():
+            resp = requests.request(method, url, timeout=timeout, **kwargs)
+        if is_retryable_status(resp.status_code):
+            raise RetryableError(f"HTTP {resp.status_code}", _retry_after(resp.headers), resp)
+        return resp
+
+    try:
+        return call_with_retry_sync(attempt, **(retry_kwargs or {}))
+    except RetryableError as e:
+        return e.response
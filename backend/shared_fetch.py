@@ -0,0 +1,55 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# -------------------------
+# CONFIG
+# -------------------------
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", "16"))  # in-flight route/weather lookups per worker
+
+# One semaphore per event loop (asyncio primitives are loop-bound), shared by
+# every pipeline run on that loop so concurrent requests share the cap too.
+_semaphores: dict = {}
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    for old_loop in [l for l in _semaphores if l.is_closed()]:
+        del _semaphores[old_loop]
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(ENRICH_CONCURRENCY)
+    return sem
+
+
+class SharedFetch:
+    """
+    Drop-in for `fetch_with_retry(session, url, params, upstream=..., hedge=...)` during one pipeline run.
+
+    Identical requests (same URL and params) are sent once and every caller
+    awaits the same result; all requests go through the per-loop
+    ENRICH_CONCURRENCY cap. Responses are shared, so callers must not mutate them.
+    """
+
+    def __init__(self, fetch):
+        self._fetch = fetch
+        self._tasks = {}
+        self.requested = 0
+        self.deduplicated = 0
+
+    async def __call__(self, session, url, params, upstream=None, hedge=None):
+        key = (url, tuple(sorted((k, str(v)) for k, v in params.items())))
+        self.requested += 1
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(self._limited(session, url, params, upstream, hedge))
+        else:
+            self.deduplicated += 1
+        # shield: one cancelled caller must not cancel the lookup for the others
+        return await asyncio.shield(task)
+
+    async def _limited(self, session, url, params, upstream, hedge):
+        async with _get_semaphore():
+            return await self._fetch(session, url, params, upstream=upstream, hedge=hedge)
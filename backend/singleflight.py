@@ -0,0 +1,197 @@
+import asyncio
+import copy
+import os
+import re
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# -------------------------
+# CONFIG
+# -------------------------
+SINGLEFLIGHT_TIMEOUT_SEC = float(os.getenv("SINGLEFLIGHT_TIMEOUT_SEC", "120"))  # then followers run it themselves
+
+
+def normalize_query(text: str) -> str:
+    """'Plan a trip to  Goa!' and 'plan a trip to goa' coalesce."""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", str(text or "").lower())).strip()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+        self.abandoned = False  # the leader was cancelled before finishing: followers run fn() themselves
+        self.waiters = []  # (loop, future) per waiting coroutine, resolved by _finish
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():  # a timed-out follower's future is already cancelled
+        waiter.set_result(None)
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls, from threads (`do`) or coroutines (`ado`).
+
+    The first caller for a key runs `fn()`; callers arriving while it runs wait
+    for it and get a deep copy of its result, or its exception. A follower that
+    waits longer than `timeout` stops waiting and runs `fn()` itself. The key is
+    released as soon as the leader finishes, so nothing is cached afterwards.
+
+    In `ado` the shared run is a detached task: cancelling the leader's caller
+    (e.g. a client that disconnected) doesn't cancel the run the followers wait on.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "followers": 0, "timeouts": 0, "errors": 0}
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: float = SINGLEFLIGHT_TIMEOUT_SEC) -> Tuple[Any, bool]:
+        """Returns (result, shared); `shared` is True when another caller's run was reused."""
+        call, leader = self._join(key)
+        if leader:
+            result = None
+            try:
+                result = fn()
+                return result, False
+            except BaseException as e:
+                self._fail(call, e)
+                raise
+            finally:
+                self._finish(key, call, result)
+
+        print(f"🔗 {self.name}: joined in-flight call ({call.followers} waiting)")
+        if not call.done.wait(timeout):
+            self._timed_out(timeout)
+            return fn(), False
+        if call.abandoned:
+            return fn(), False
+        return self._shared_result(call)
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable], timeout: float = SINGLEFLIGHT_TIMEOUT_SEC) -> Tuple[Any, bool]:
+        """`do` for coroutines: `fn()` returns an awaitable; followers wait without blocking the loop."""
+        call, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._settle(key, call, t))
+            return await asyncio.shield(task), False
+
+        print(f"🔗 {self.name}: joined in-flight call ({call.followers} waiting)")
+        # Wait on a future, not a pooled thread: the leader may need the default executor itself.
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        with self._lock:
+            if call.done.is_set():
+                waiter.set_result(None)
+            else:
+                call.waiters.append((loop, waiter))
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self._timed_out(timeout)
+            return await fn(), False
+        if call.abandoned:
+            return await fn(), False
+        return self._shared_result(call)
+
+    def _join(self, key: str) -> Tuple[_Call, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["leaders"] += 1
+            else:
+                call.followers += 1
+                self._stats["followers"] += 1
+        return call, leader
+
+    def _settle(self, key: str, call: _Call, task: asyncio.Future):
+        result = None
+        if task.cancelled():
+            self._fail(call, asyncio.CancelledError())
+        elif task.exception() is not None:
+            self._fail(call, task.exception())
+        else:
+            result = task.result()
+        self._finish(key, call, result)
+
+    def _fail(self, call: _Call, e: BaseException):
+        if isinstance(e, asyncio.CancelledError):
+            call.abandoned = True  # never hand a cancellation to the followers
+            return
+        call.error = e
+        with self._lock:
+            self._stats["errors"] += 1
+
+    def _finish(self, key: str, call: _Call, result):
+        with self._lock:
+            del self._calls[key]
+            followers = call.followers
+        if followers and call.error is None and not call.abandoned:
+            # Snapshot before the leader's caller can mutate its copy.
+            call.result = copy.deepcopy(result)
+        with self._lock:
+            call.done.set()
+            waiters, call.waiters = call.waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                pass  # that follower's loop is closed
+
+    def _timed_out(self, timeout: float):
+        with self._lock:
+            self._stats["timeouts"] += 1
+        print(f"⚠️ {self.name}: in-flight call exceeded {timeout:.0f}s, running independently")
+
+    @staticmethod
+    def _shared_result(call: _Call):
+        if call.error is not None:
+            raise call.error
+        return copy.deepcopy(call.result), True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._calls)}
+
+
+intent_flight = SingleFlight("trip_intent")
+itinerary_flight = SingleFlight("itinerary")
+
+
+def get_singleflight_stats() -> dict:
+    return {"trip_intent": intent_flight.stats(), "itinerary": itinerary_flight.stats()}
+
+
+if __name__ == "__main__":
+    # Cancelling the leader must not fail the followers: python singleflight.py
+    async def _check_leader_cancelled():
+        flight = SingleFlight("check")
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.1)
+            return {"value": 42}
+
+        leader = asyncio.ensure_future(flight.ado("k", work))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.ensure_future(flight.ado("k", work)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        assert leader.cancelled()
+        assert results == [({"value": 42}, True)] * 3, results
+        assert len(runs) == 1, runs
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(_check_leader_cancelled())
+    print("✅ singleflight checks passed")
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# -------------------------
+# CONFIG
+# -------------------------
+CACHE_DB_PATH = os.getenv(
+    "PLANNER_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "planner_cache.sqlite3"),
+)
+CACHE_TOUCH_INTERVAL_SEC = 60  # don't rewrite accessed_at on every hit
+CACHE_EVICT_EVERY = 50  # sets between size/expiry sweeps
+CACHE_BATCH_SIZE = 500  # keys per IN (...) query, below SQLite's variable limit
+
+
+class SqliteTTLCache:
+    """
+    Small key/value cache on a shared SQLite file.
+
+    All Gunicorn workers open the same file (WAL mode), so a value cached by one
+    worker is a hit for the others and survives restarts. Entries expire after
+    `ttl_sec`; past `max_entries` the least recently used ones are evicted.
+    Values must be JSON-serialisable.
+
+    Coroutines use the `a*` methods, which run the blocking SQLite calls (up to
+    the 5 s busy timeout under write contention) off the event loop.
+    """
+
+    def __init__(self, name: str, ttl_sec: float, max_entries: int, path: str = CACHE_DB_PATH):
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name):
+            raise ValueError(f"Invalid cache name: {name}")
+        self.name = name
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sets = 0
+        self._stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "errors": 0}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.name}_accessed ON {self.name} (accessed_at)")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, stat: str, n: int = 1):
+        with self._lock:
+            self._stats[stat] += n
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                f"SELECT value, expires_at, accessed_at FROM {self.name} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < now:
+                self._count("misses")
+                return None
+            if now - row[2] > CACHE_TOUCH_INTERVAL_SEC:
+                conn.execute(f"UPDATE {self.name} SET accessed_at = ? WHERE key = ?", (now, key))
+            self._count("hits")
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            print(f"⚠️ Cache '{self.name}' read failed: {e}")
+            self._count("errors")
+            self._count("misses")
+            return None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Batch lookup; returns only the keys that hit."""
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+        try:
+            conn = self._conn()
+            for i in range(0, len(keys), CACHE_BATCH_SIZE):
+                batch = keys[i:i + CACHE_BATCH_SIZE]
+                marks = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, value, accessed_at FROM {self.name} "
+                    f"WHERE key IN ({marks}) AND expires_at >= ?",
+                    (*batch, now),
+                ).fetchall()
+                stale = [k for k, _, accessed_at in rows if now - accessed_at > CACHE_TOUCH_INTERVAL_SEC]
+                if stale:
+                    conn.executemany(f"UPDATE {self.name} SET accessed_at = ? WHERE key = ?", [(now, k) for k in stale])
+                for k, value, _ in rows:
+                    found[k] = json.loads(value)
+        except sqlite3.Error as e:
+            print(f"⚠️ Cache '{self.name}' read failed: {e}")
+            self._count("errors")
+        self._count("hits", len(found))
+        self._count("misses", len(keys) - len(found))
+        return found
+
+    def set(self, key: str, value: Any, ttl_sec: Optional[float] = None):
+        now = time.time()
+        ttl = self.ttl_sec if ttl_sec is None else ttl_sec
+        try:
+            conn = self._conn()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.name} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, separators=(",", ":")), now + ttl, now),
+            )
+            self._count("sets")
+            if self._due_for_sweep(1):
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"⚠️ Cache '{self.name}' write failed: {e}")
+            self._count("errors")
+
+    def set_many(self, items: Dict[str, Any], ttl_sec: Optional[float] = None):
+        if not items:
+            return
+        now = time.time()
+        ttl = self.ttl_sec if ttl_sec is None else ttl_sec
+        conn = None
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN")
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.name} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                [(k, json.dumps(v, separators=(",", ":")), now + ttl, now) for k, v in items.items()],
+            )
+            conn.execute("COMMIT")
+            self._count("sets", len(items))
+            if self._due_for_sweep(len(items)):
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"⚠️ Cache '{self.name}' write failed: {e}")
+            self._count("errors")
+            if conn is not None and conn.in_transaction:
+                conn.execute("ROLLBACK")
+
+    def _due_for_sweep(self, inserted: int) -> bool:
+        """True once every CACHE_EVICT_EVERY inserted entries, not on every write."""
+        with self._lock:
+            before = self._sets
+            self._sets += inserted
+            return self._sets // CACHE_EVICT_EVERY > before // CACHE_EVICT_EVERY
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aget_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.get_many, list(keys))
+
+    async def aset(self, key: str, value: Any, ttl_sec: Optional[float] = None):
+        await asyncio.to_thread(self.set, key, value, ttl_sec)
+
+    async def aset_many(self, items: Dict[str, Any], ttl_sec: Optional[float] = None):
+        await asyncio.to_thread(self.set_many, items, ttl_sec)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        removed = conn.execute(f"DELETE FROM {self.name} WHERE expires_at < ?", (now,)).rowcount
+        overflow = conn.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            removed += conn.execute(
+                f"DELETE FROM {self.name} WHERE key IN "
+                f"(SELECT key FROM {self.name} ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            ).rowcount
+        self._count("evictions", removed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        try:
+            stats["entries"] = self._conn().execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+        except sqlite3.Error:
+            stats["entries"] = None
+        return stats
@@ -0,0 +1,120 @@
+import asyncio
+import datetime
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import google.auth.transport.requests
+from dotenv import load_dotenv
+from event_loop import run_sync
+from google import genai
+from google.oauth2 import service_account
+load_dotenv()
+
+# -------------------------
+# CONFIG
+# -------------------------
+SERVICE_ACCOUNT_PATH = os.getenv("SERVICE_ACCOUNT_PATH")
+VERTEX_PROJECT = os.getenv("VERTEX_PROJECT")
+VERTEX_LOCATION = os.getenv("VERTEX_LOCATION")
+SCOPES = os.getenv("SCOPES").split(",") if os.getenv("SCOPES") else ["https://www.googleapis.com/auth/cloud-platform"]
+VERTEX_TOKEN_REFRESH_MARGIN_SEC = int(os.getenv("VERTEX_TOKEN_REFRESH_MARGIN_SEC", "600"))  # refresh this long before expiry
+VERTEX_WARMUP = os.getenv("VERTEX_WARMUP", "1") == "1"  # warm clients when the app starts
+VERTEX_WARMUP_MODEL = os.getenv("VERTEX_WARMUP_MODEL", "gemini-2.5-flash-lite")
+
+# -------------------------
+# SHARED CLIENT
+# -------------------------
+# One service-account credential per worker process, shared by one genai.Client
+# per (project, location, event loop). A daemon thread refreshes the token ahead
+# of expiry so no request pays for the OAuth round trip. The async surface
+# (`client.aio`) pools connections in an aiohttp session bound to the loop that
+# first used it, hence a client per loop, like http_client.py.
+
+_credentials = None
+_async_clients: Dict[Tuple[str, str, asyncio.AbstractEventLoop], genai.Client] = {}
+_pid = None
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # Threads and pooled connections don't survive Gunicorn's fork.
+    global _credentials, _async_clients, _pid
+    if _pid != os.getpid():
+        _credentials, _async_clients, _pid = None, {}, os.getpid()
+
+
+def get_credentials() -> service_account.Credentials:
+    global _credentials
+    with _lock:
+        _reset_after_fork()
+        if _credentials is None:
+            _credentials = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_PATH, scopes=SCOPES)
+            threading.Thread(target=_refresh_loop, args=(_credentials,), name="vertex-token-refresh", daemon=True).start()
+        return _credentials
+
+
+def get_async_models(project: Optional[str] = None, location: Optional[str] = None):
+    """`client.aio.models` for the running event loop; await its methods, don't close it."""
+    loop = asyncio.get_running_loop()
+    project, location = project or VERTEX_PROJECT, location or VERTEX_LOCATION
+    credentials = get_credentials()
+    with _lock:
+        for key in [k for k in _async_clients if k[2].is_closed()]:
+            del _async_clients[key]
+        client = _async_clients.get((project, location, loop))
+        if client is None:
+            client = _async_clients[(project, location, loop)] = genai.Client(
+                vertexai=True, project=project, location=location, credentials=credentials
+            )
+        return client.aio.models
+
+
+def _refresh(credentials):
+    credentials.refresh(google.auth.transport.requests.Request())
+
+
+def _seconds_left(credentials) -> float:
+    if not credentials.token or credentials.expiry is None:
+        return 0.0
+    expiry = credentials.expiry.replace(tzinfo=datetime.timezone.utc)  # google-auth stores naive UTC
+    return (expiry - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+
+
+def _refresh_loop(credentials):
+    while True:
+        try:
+            if _seconds_left(credentials) < VERTEX_TOKEN_REFRESH_MARGIN_SEC:
+                _refresh(credentials)
+                print("🔑 Vertex token refreshed")
+            time.sleep(max(30.0, _seconds_left(credentials) - VERTEX_TOKEN_REFRESH_MARGIN_SEC))
+        except Exception as e:
+            print(f"⚠️ Vertex token refresh failed: {e}")
+            time.sleep(30)
+
+
+async def awarm_up(project: Optional[str] = None, location: Optional[str] = None, model: str = VERTEX_WARMUP_MODEL):
+    """Fetch a token and open the running loop's HTTPS connection so the first real call doesn't pay for either."""
+    t0 = time.time()
+    try:
+        credentials = await asyncio.to_thread(get_credentials)
+        if _seconds_left(credentials) <= 0:
+            await asyncio.to_thread(_refresh, credentials)
+        await get_async_models(project, location).get(model=model)
+        print(f"✅ Vertex client warmed up in {time.time() - t0:.2f}s")
+    except Exception as e:
+        print(f"⚠️ Vertex warm-up failed: {e}")
+
+
+def warm_up(project: Optional[str] = None, location: Optional[str] = None, model: str = VERTEX_WARMUP_MODEL):
+    """awarm_up on the process-wide loop, where the Flask app's pipelines make their calls."""
+    run_sync(awarm_up(project, location, model))
+
+
+def start_warm_up(*targets: Tuple[Optional[str], Optional[str]]):
+    """Warm the given (project, location) clients (default: the configured one) in the background."""
+    if not VERTEX_WARMUP:
+        return
+    for project, location in targets or [(None, None)]:
+        threading.Thread(target=warm_up, args=(project, location), name="vertex-warmup", daemon=True).start()
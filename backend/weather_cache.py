@@ -0,0 +1,62 @@
+import asyncio
+import math
+import os
+from typing import Awaitable, Callable, Tuple
+
+from dotenv import load_dotenv
+from sqlite_cache import SqliteTTLCache
+load_dotenv()
+
+# -------------------------
+# CONFIG
+# -------------------------
+WEATHER_GRID_DEG = float(os.getenv("WEATHER_GRID_DEG", "0.05"))  # ~5.5 km cells
+WEATHER_CACHE_TTL_SEC = int(os.getenv("WEATHER_CACHE_TTL_SEC", "900"))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "20000"))
+WEATHER_UNKNOWN = "unknown"  # failed lookup; never cached
+
+weather_cache = SqliteTTLCache("weather_cells", WEATHER_CACHE_TTL_SEC, WEATHER_CACHE_MAX_ENTRIES)
+
+# In-flight lookups per (loop, cell), so concurrent activities in one cell share a request.
+_inflight: dict = {}
+
+
+def weather_cell(lat: float, lon: float) -> Tuple[float, float]:
+    """Centre of the WEATHER_GRID_DEG grid cell containing (lat, lon)."""
+    def snap(v):
+        return round((math.floor(v / WEATHER_GRID_DEG) + 0.5) * WEATHER_GRID_DEG, 6)
+    return snap(lat), snap(lon)
+
+
+async def cached_weather(lat: float, lon: float, lookup: Callable[[float, float], Awaitable[str]]) -> str:
+    """
+    Weather condition for (lat, lon), looked up once per grid cell.
+
+    `lookup(cell_lat, cell_lon)` is called with the cell centre only on a cache
+    miss, and only once for all concurrent callers in the same cell.
+    """
+    cell = weather_cell(float(lat), float(lon))
+    key = f"{cell[0]},{cell[1]}"
+
+    cond = await weather_cache.aget(key)
+    if cond is not None:
+        return cond
+
+    loop = asyncio.get_running_loop()
+    task = _inflight.get((loop, key))
+    if task is None:
+        task = asyncio.ensure_future(_lookup_and_store(key, cell, lookup))
+        _inflight[(loop, key)] = task
+        task.add_done_callback(lambda _: _inflight.pop((loop, key), None))
+    return await asyncio.shield(task)
+
+
+async def _lookup_and_store(key, cell, lookup) -> str:
+    cond = await lookup(*cell)
+    if cond != WEATHER_UNKNOWN:
+        await weather_cache.aset(key, cond)
+    return cond
+
+
+def get_weather_cache_stats() -> dict:
+    return weather_cache.stats()